@@ -1,176 +1,948 @@
-'''
---------------------------------------------------------------------------------
-G e n e r a l I n f o r m a t i o n
---------------------------------------------------------------------------------
-Name: weather.py
-
-Usage: python datafile
-
-Description: Code to analyze weather data
-
-Inputs: name of data file containing weather data
-
-Outputs: plots and analysis
-
-Auxiliary Files: None
-
-Special Instructions: None
-
---------------------------------------------------------------------------------
-'''
-import sys
-import matplotlib.pylab as plt
-import numpy as np
-
-# Pseudocode:
-# 1) get the name of the data file from the user on the command line
-# 2) open the data file
-# 3) read the first line of data and throw it away (it is the header info the computer doesn't need)
-#       from all the remaining lines:
-#       read in the date (index 2) and temperature (index 3)
-#       parse the date string into year, month, day
-#       convert year, month, day into decimal years for plotting
-# 4) make two lists for the time series - the decimal year list and the temperature list
-# 5) sort the data by month so we can average it and take the standard deviation later
-# 6) Plot the results
-
-
-def parse_data(infile):
-    """
-    Function to parse weather data
-    :param infile: weather data input file
-    :return: two lists. One list with the information from the third column (date) and the fourth column (temperature)
-                        One list with the information from the third column (date) and the 18th (min) and 19th column (max temp)
-    """
- 
-    wdates_and_temp = []    # list of dates data broken up into year, month, day, and then the temperature for that day
-    wdates_min_max = []     # list of year along with min and max temperatures for each day
-
-    with open(infile, mode='r') as file:
-        data = file.readlines()[1:]
-
-        for line in data:
-            values = line.split()
-            date = values[2]
-            wdates_and_temp.append([float(date[0:4]), float(date[4:6]), float(date[6:]), float(values[3])])
-            wdates_min_max.append([float(date[0:4]), float(values[18]), float(values[17])])
-        
-    file.close()
-
-    return wdates_and_temp, wdates_min_max
-
-def calc_mean_std_dev(wdates_and_temp):
-    """
-    Calculate the mean temperature per month
-    Calculate the standard deviation per month's mean
-    :param wdates: list with dates fields
-    :param wtemp: temperature per month
-    :return: means, std_dev: months_mean and std_dev lists
-    """
-    means = []
-    std_dev = []
-    temp_list = []
-    wdates_and_temp.sort(key = lambda x: x[1])
-
-    month = 1.0
-    for val in wdates_and_temp:
-        if val[1] > month:
-            month += 1
-            means.append(np.mean(temp_list))
-            std_dev.append(np.std(temp_list))
-            temp_list.clear()
-        temp_list.append(val[3])
-        
-    means.append(np.mean(temp_list))
-    std_dev.append(np.std(temp_list))
-    return means, std_dev
-
-def plot_data_task1(wyear, wtemp, month_mean, month_std):
-    """
-    Create plot for Task 1.
-    :param: wyear: list with year (in decimal)
-    :param: wtemp: temperature per
-    :param: month_mean: list with month's mean values
-    :param: month_std: list with month's mean standard dev values
-    """
-    # Create canvas with two subplots
-    plt.figure()
-    plt.subplot(2, 1, 1)                # select first subplot
-    plt.title("Temperatures at Ogden")
-    plt.plot(wyear, wtemp, "bo")
-    plt.ylabel("Temperature, F")
-    plt.xlabel("Decimal Year")
-
-    plt.subplot(2, 1, 2)                # select second subplot
-    plt.ylabel("Temperature, F")
-    months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun",
-              "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
-    monthNumber = list(range(1, 13, 1))
-    plt.xlim([0.7, 13])
-    plt.ylim([0, 90])
-    width = 0.8
-    plt.bar(monthNumber, month_mean, yerr=month_std, width=width,
-            color="lightgreen", ecolor="black", linewidth=1.5)
-    plt.xticks(monthNumber, months)
-    plt.show()      # display plot
-
-def calc_min_max(wdates_min_max):
-    """
-    Function that finds the min and max temperature for each year and then returns it as a list.
-    :param: wdates_min_max: list that contains the year, min, and max temperatures
-    :returns: year_min_max: list with the min and max temperature of each year
-    """
-    year_min_max = []
-    min_temp = 212
-    max_temp = 0
-    wdates_min_max.sort(key = lambda x: x[0])
-    year = wdates_min_max[0][0] 
-    for val in wdates_min_max:
-        if val[0] > year:
-            year_min_max.append([year, min_temp, max_temp])
-            year = val[0]
-            min_temp = val[1]
-            max_temp = val[2]
-        if val[1] < min_temp:
-            min_temp = val[1]
-        if val[2] > max_temp and val[2] < 200:
-            max_temp = val[2]
-    year_min_max.append([year, min_temp, max_temp])
-
-    return year_min_max
-
-
-def plot_data_task2(year_min_max):
-    """
-    Function that plots the min and max temperatures for each year
-    :param: year_min_max: list that holds the year and the min and max temperatures for that year
-    """
-    year = np.array(year_min_max)[:,0].tolist()
-    min = np.array(year_min_max)[:,1].tolist()
-    max = np.array(year_min_max)[:,2].tolist()
-    plt.plot(year, min, "bo", label="Minimum Temp")
-    plt.plot(year, max, "ro", label="Maximum Temp")
-    plt.ylabel("Temperature, F")
-    plt.xlabel("Year")
-    plt.title("Min and Max Temperature by Year")
-    plt.legend()
-    plt.show()
-
-
-
-def main(infile):
-    weather_data = infile    # take data file as input parameter to file
-    wdates_and_temp, wdates_min_max = parse_data(weather_data)
-    # Calculate mean and standard dev per month
-    month_mean, month_std = calc_mean_std_dev(wdates_and_temp)
-    #               1) years,                                 2) temperature,                       3) month_mean, 4) month_std
-    plot_data_task1(np.array(wdates_and_temp)[:,0].tolist(), np.array(wdates_and_temp)[:,-1].tolist(), month_mean, month_std)
-    year_min_max = calc_min_max(wdates_min_max)
-    plot_data_task2(year_min_max)
-
-
-
-if __name__ == "__main__":
-    infile = 'data/CDO6674605799016.txt'  # for testing
-    #infile = sys.argv[1]
-    main(infile)
+'''
+--------------------------------------------------------------------------------
+G e n e r a l I n f o r m a t i o n
+--------------------------------------------------------------------------------
+Name: weather.py
+
+Usage: python weather.py [datafile]
+       python weather.py --batch <directory or glob> [--workers N] [--output stats.csv]
+       python weather.py --incremental datafile [--output stats.csv]
+
+Description: Code to analyze weather data
+
+Inputs: name of data file containing weather data
+
+Outputs: plots and analysis
+
+Auxiliary Files: None
+
+Special Instructions: None
+
+--------------------------------------------------------------------------------
+'''
+import sys
+import os
+import glob
+import argparse
+import hashlib
+import itertools
+import datetime
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib.pylab as plt
+import numpy as np
+
+# Pseudocode:
+# 1) get the name of the data file from the user on the command line
+# 2) open the data file
+# 3) read the first line of data and throw it away (it is the header info the computer doesn't need)
+#       from all the remaining lines:
+#       read in the date (index 2) and temperature (index 3)
+#       parse the date string into year, month, day
+#       convert year, month, day into decimal years for plotting
+# 4) make two lists for the time series - the decimal year list and the temperature list
+# 5) sort the data by month so we can average it and take the standard deviation later
+# 6) Plot the results
+
+
+# Column layout of a GSOD data record (see data/GSOD_DESC.txt). The fields are whitespace separated,
+# so these are the indexes after line.split(), not the character positions from the description.
+GSOD_DTYPE = np.dtype([
+    ("stn", "i4"), ("wban", "i4"), ("yearmoda", "i4"),
+    ("temp", "f8"), ("temp_count", "i2"),
+    ("dewp", "f8"), ("dewp_count", "i2"),
+    ("slp", "f8"), ("slp_count", "i2"),
+    ("stp", "f8"), ("stp_count", "i2"),
+    ("visib", "f8"), ("visib_count", "i2"),
+    ("wdsp", "f8"), ("wdsp_count", "i2"),
+    ("mxspd", "f8"), ("gust", "f8"),
+    ("max", "f8"), ("min", "f8"),
+    ("prcp", "f8"), ("sndp", "f8"),
+    ("frshtt", "S6"),
+])
+# value that marks a missing measurement in each numeric column (from data/GSOD_DESC.txt)
+GSOD_MISSING = {
+    "temp": 9999.9, "dewp": 9999.9, "slp": 9999.9, "stp": 9999.9, "max": 9999.9, "min": 9999.9,
+    "visib": 999.9, "wdsp": 999.9, "mxspd": 999.9, "gust": 999.9, "sndp": 999.9,
+    "prcp": 99.99,
+}
+GSOD_CACHE_DIR = ".gsod_cache"  # folder created next to the data file to hold the parsed copies
+
+
+def _gsod_value(token):
+    """
+    Convert one GSOD field to a number. MAX/MIN can end with a '*' flag and PRCP ends with a
+    letter flag (A-I), so any trailing flag character is dropped before converting.
+    :param token: string from the split line
+    :return: float value of the field
+    """
+    if token[-1].isalpha() or token[-1] == "*":
+        token = token[:-1]
+    return float(token)
+
+
+def parse_gsod_lines(lines):
+    """
+    Parse GSOD data lines (no header) into a structured numpy array
+    :param lines: iterable of data lines from a GSOD file
+    :return: numpy array with GSOD_DTYPE, one record per non-blank line
+    """
+    rows = []
+    for line in lines:
+        values = line.split()
+        if not values:
+            continue
+        rows.append((int(values[0]), int(values[1]), int(values[2]),
+                     float(values[3]), int(values[4]),
+                     float(values[5]), int(values[6]),
+                     float(values[7]), int(values[8]),
+                     float(values[9]), int(values[10]),
+                     float(values[11]), int(values[12]),
+                     float(values[13]), int(values[14]),
+                     float(values[15]), float(values[16]),
+                     _gsod_value(values[17]), _gsod_value(values[18]),
+                     _gsod_value(values[19]), float(values[20]),
+                     values[21]))
+    return np.array(rows, dtype=GSOD_DTYPE)
+
+
+def _cache_path(infile, cache_dir=None):
+    """
+    Build the cache file name for a data file. The name includes a hash of the absolute path,
+    the file size and the modification time so an edited or replaced file never hits an old cache.
+    :param infile: weather data input file
+    :param cache_dir: folder for the cache files, defaults to GSOD_CACHE_DIR next to infile
+    :return: path of the cache file
+    """
+    path = os.path.abspath(infile)
+    info = os.stat(path)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(path), GSOD_CACHE_DIR)
+    key = "{}:{}:{}".format(path, info.st_size, info.st_mtime_ns)
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, "{}-{}.npy".format(os.path.basename(path), digest))
+
+
+def load_gsod(infile, cache_dir=None, use_cache=True):
+    """
+    Load a GSOD station file as a structured numpy array (columns named as in GSOD_DTYPE).
+    The first load parses the text and saves a binary copy in the cache folder. Later loads of the
+    same unchanged file memory-map that copy, so no text parsing happens at all. If the cache cannot
+    be written (read-only folder) the parsed records are returned without one.
+    :param infile: weather data input file
+    :param cache_dir: folder for the cache files, defaults to GSOD_CACHE_DIR next to infile
+    :param use_cache: set to False to always parse the text file
+    :return: numpy array with GSOD_DTYPE (read-only memory map when it came from the cache)
+    """
+    if not use_cache:
+        with open(infile, mode='r') as file:
+            next(file, None)    # header line
+            return parse_gsod_lines(file)
+
+    cache_file = _cache_path(infile, cache_dir)
+    if os.path.exists(cache_file):
+        return np.load(cache_file, mmap_mode='r')
+
+    with open(infile, mode='r') as file:
+        next(file, None)    # header line
+        records = parse_gsod_lines(file)
+
+    cache_folder = os.path.dirname(cache_file)
+    try:
+        os.makedirs(cache_folder, exist_ok=True)
+        # remove caches of older versions of the same data file
+        prefix = os.path.basename(infile) + "-"
+        for name in os.listdir(cache_folder):
+            if name.startswith(prefix) and name.endswith(".npy") and len(name) == len(prefix) + 20:
+                os.remove(os.path.join(cache_folder, name))
+        # write to a temporary file first so a crash never leaves a half written cache behind
+        tmp_file = cache_file + ".tmp"
+        with open(tmp_file, mode='wb') as file:
+            np.save(file, records)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        pass    # read-only folder, the parsed records are still good
+    return records
+
+
+def iter_gsod_batches(infile, batch_size=100000):
+    """
+    Read a GSOD file a fixed number of lines at a time so memory use stays the same no matter
+    how big the file is
+    :param infile: weather data input file
+    :param batch_size: number of lines parsed per batch
+    :return: generator of numpy arrays with GSOD_DTYPE, each with at most batch_size records
+    """
+    with open(infile, mode='r') as file:
+        next(file, None)    # header line
+        while True:
+            batch = parse_gsod_lines(itertools.islice(file, batch_size))
+            if batch.size == 0:
+                return
+            yield batch
+
+
+def parse_data(infile):
+    """
+    Function to parse weather data
+    :param infile: weather data input file
+    :return: two lists. One list with the information from the third column (date) and the fourth column (temperature)
+                        One list with the information from the third column (date) and the 18th (min) and 19th column (max temp)
+    """
+    records = load_gsod(infile)
+    year = records["yearmoda"] // 10000
+    month = records["yearmoda"] // 100 % 100
+    day = records["yearmoda"] % 100
+
+    # list of dates data broken up into year, month, day, and then the temperature for that day
+    wdates_and_temp = np.column_stack((year, month, day, records["temp"])).tolist()
+    # list of year along with min and max temperatures for each day
+    wdates_min_max = np.column_stack((year, records["min"], records["max"])).tolist()
+
+    return wdates_and_temp, wdates_min_max
+
+def group_index(yearmoda, by="month"):
+    """
+    Turn YEARMODA dates into a bin index for grouping without having to sort
+    :param yearmoda: array of dates as YYYYMMDD integers
+    :param by: "month", "year" or "year_month"
+    :return: index: bin number for every date
+             keys: the month (1-12), year or YYYYMM value of every bin
+    """
+    yearmoda = np.asarray(yearmoda, dtype=np.int64)
+    month = yearmoda // 100 % 100
+    if by == "month":
+        return month - 1, np.arange(1, 13)
+    year = yearmoda // 10000
+    first_year = year.min() if year.size else 0
+    last_year = year.max() if year.size else -1
+    if by == "year":
+        return year - first_year, np.arange(first_year, last_year + 1)
+    if by == "year_month":
+        years = np.repeat(np.arange(first_year, last_year + 1), 12)
+        months = np.tile(np.arange(1, 13), last_year - first_year + 1)
+        return (year - first_year) * 12 + month - 1, years * 100 + months
+    raise ValueError("by must be 'month', 'year' or 'year_month', not {!r}".format(by))
+
+
+def group_stats(yearmoda, values, by="month", missing=GSOD_MISSING["temp"]):
+    """
+    Calculate count, mean, standard deviation, min and max of values per month, year or
+    (year, month) in one vectorized pass using bincount and unbuffered ufuncs.
+    Values equal to missing (the GSOD sentinel of the column) are left out.
+    :param yearmoda: array of dates as YYYYMMDD integers
+    :param values: array of values, one per date
+    :param by: "month", "year" or "year_month"
+    :param missing: value that marks a missing measurement, see GSOD_MISSING; None keeps everything
+    :return: dictionary of arrays keyed by "key", "count", "mean", "std", "min" and "max"
+             with one entry per group that has data, in increasing key order
+    """
+    values = np.asarray(values, dtype=np.float64)
+    index, keys = group_index(yearmoda, by)
+    if missing is not None:
+        valid = values != missing
+        index = index[valid]
+        values = values[valid]
+    bins = keys.size
+
+    count = np.bincount(index, minlength=bins)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(index, weights=values, minlength=bins) / count
+        # second pass around the group mean keeps the variance accurate for large values
+        m2 = np.bincount(index, weights=(values - mean[index])**2, minlength=bins)
+        std = np.sqrt(m2 / count)
+    minimum = np.full(bins, np.inf)
+    maximum = np.full(bins, -np.inf)
+    np.minimum.at(minimum, index, values)
+    np.maximum.at(maximum, index, values)
+
+    found = count > 0
+    return {"key": keys[found], "count": count[found], "mean": mean[found], "std": std[found],
+            "min": minimum[found], "max": maximum[found]}
+
+
+class RunningStats:
+    """
+    Count, mean, standard deviation, min and max per group that are updated one batch at a time.
+    Batches are combined with the parallel form of Welford's algorithm (Chan et al.), so only
+    one row per group is kept no matter how many values have been seen.
+    """
+
+    def __init__(self, by="month", missing=GSOD_MISSING["temp"]):
+        """
+        :param by: "month", "year" or "year_month", see group_index
+        :param missing: value that marks a missing measurement, see GSOD_MISSING; None keeps everything
+        """
+        self.by = by
+        self.missing = missing
+        self.key = np.empty(0, dtype=np.int64)
+        self.count = np.empty(0, dtype=np.int64)
+        self.mean = np.empty(0)
+        self.m2 = np.empty(0)       # sum of squared differences from the mean
+        self.min = np.empty(0)
+        self.max = np.empty(0)
+
+    def update(self, yearmoda, values):
+        """
+        Add a batch of values
+        :param yearmoda: array of dates as YYYYMMDD integers
+        :param values: array of values, one per date
+        :return: Nothing
+        """
+        if len(yearmoda) == 0:
+            return
+        stats = group_stats(yearmoda, values, by=self.by, missing=self.missing)
+        self._combine(stats["key"], stats["count"], stats["mean"], stats["std"]**2 * stats["count"],
+                      stats["min"], stats["max"])
+
+    def merge(self, other):
+        """
+        Add everything another RunningStats (same grouping) has seen
+        :param other: RunningStats to merge in
+        :return: Nothing
+        """
+        if other.by != self.by:
+            raise ValueError("cannot merge stats grouped by {!r} into stats grouped by {!r}".format(other.by, self.by))
+        self._combine(other.key, other.count, other.mean, other.m2, other.min, other.max)
+
+    def _combine(self, key, count, mean, m2, minimum, maximum):
+        """
+        Merge per-group partial results into the running totals
+        """
+        keys = np.union1d(self.key, key)
+        mine = np.searchsorted(keys, self.key)
+        theirs = np.searchsorted(keys, key)
+
+        count_a = np.zeros(keys.size, dtype=np.int64)
+        count_b = np.zeros(keys.size, dtype=np.int64)
+        mean_a, mean_b = np.zeros(keys.size), np.zeros(keys.size)
+        m2_a, m2_b = np.zeros(keys.size), np.zeros(keys.size)
+        count_a[mine], mean_a[mine], m2_a[mine] = self.count, self.mean, self.m2
+        count_b[theirs], mean_b[theirs], m2_b[theirs] = count, mean, m2
+
+        total = count_a + count_b
+        delta = mean_b - mean_a
+        self.mean = mean_a + delta * count_b / total
+        self.m2 = m2_a + m2_b + delta**2 * count_a * count_b / total
+        self.count = total
+
+        new_min = np.full(keys.size, np.inf)
+        new_max = np.full(keys.size, -np.inf)
+        new_min[mine], new_max[mine] = self.min, self.max
+        new_min[theirs] = np.minimum(new_min[theirs], minimum)
+        new_max[theirs] = np.maximum(new_max[theirs], maximum)
+        self.min, self.max = new_min, new_max
+        self.key = keys
+
+    def to_arrays(self, prefix=""):
+        """
+        Export the running state, e.g. for np.savez
+        :param prefix: text put in front of every name
+        :return: dictionary of numpy arrays
+        """
+        missing = np.nan if self.missing is None else self.missing
+        return {prefix + "by": np.array(self.by), prefix + "missing": np.array(missing, dtype=np.float64),
+                prefix + "key": self.key, prefix + "count": self.count, prefix + "mean": self.mean,
+                prefix + "m2": self.m2, prefix + "min": self.min, prefix + "max": self.max}
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix=""):
+        """
+        Rebuild a RunningStats from the output of to_arrays
+        :param arrays: dictionary (or loaded npz file) of numpy arrays
+        :param prefix: text put in front of every name
+        :return: RunningStats
+        """
+        # state saved before the missing value was stored used the temperature sentinel
+        missing = float(arrays[prefix + "missing"]) if prefix + "missing" in arrays else GSOD_MISSING["temp"]
+        stats = cls(by=str(arrays[prefix + "by"]), missing=None if np.isnan(missing) else missing)
+        stats.key = np.array(arrays[prefix + "key"], dtype=np.int64)
+        stats.count = np.array(arrays[prefix + "count"], dtype=np.int64)
+        stats.mean = np.array(arrays[prefix + "mean"], dtype=np.float64)
+        stats.m2 = np.array(arrays[prefix + "m2"], dtype=np.float64)
+        stats.min = np.array(arrays[prefix + "min"], dtype=np.float64)
+        stats.max = np.array(arrays[prefix + "max"], dtype=np.float64)
+        return stats
+
+    def result(self):
+        """
+        :return: dictionary of arrays in the same form as group_stats
+        """
+        return {"key": self.key.copy(), "count": self.count.copy(), "mean": self.mean.copy(),
+                "std": np.sqrt(self.m2 / self.count), "min": self.min.copy(), "max": self.max.copy()}
+
+
+def stream_station_stats(infile, batch_size=100000):
+    """
+    Compute the monthly temperature stats and the yearly min and max of a station in
+    bounded memory by feeding batches of the file into running accumulators
+    :param infile: weather data input file
+    :param batch_size: number of lines parsed per batch
+    :return: monthly: RunningStats of TEMP by month
+             yearly_min: RunningStats of MIN by year
+             yearly_max: RunningStats of MAX by year
+    """
+    monthly = RunningStats(by="month", missing=GSOD_MISSING["temp"])
+    yearly_min = RunningStats(by="year", missing=GSOD_MISSING["min"])
+    yearly_max = RunningStats(by="year", missing=GSOD_MISSING["max"])
+    for batch in iter_gsod_batches(infile, batch_size):
+        monthly.update(batch["yearmoda"], batch["temp"])
+        yearly_min.update(batch["yearmoda"], batch["min"])
+        yearly_max.update(batch["yearmoda"], batch["max"])
+    return monthly, yearly_min, yearly_max
+
+
+def year_min_max_table(min_stats, max_stats):
+    """
+    Line up yearly min and max results by year
+    :param min_stats: group_stats style dictionary of the MIN column by year
+    :param max_stats: group_stats style dictionary of the MAX column by year
+    :return: year_min_max: list with the year, min and max temperature of each year
+    """
+    # a year may have no valid min or max, so the two key lists can differ
+    years = np.union1d(min_stats["key"], max_stats["key"])
+    min_temp = np.full(years.size, np.nan)
+    max_temp = np.full(years.size, np.nan)
+    min_temp[np.searchsorted(years, min_stats["key"])] = min_stats["min"]
+    max_temp[np.searchsorted(years, max_stats["key"])] = max_stats["max"]
+    return np.column_stack((years.astype(np.float64), min_temp, max_temp)).tolist()
+
+
+def calc_mean_std_dev(wdates_and_temp):
+    """
+    Calculate the mean temperature per month
+    Calculate the standard deviation per month's mean
+    :param wdates_and_temp: list of [year, month, day, temperature] lists
+    :return: means, std_dev: months_mean and std_dev lists
+    """
+    data = np.asarray(wdates_and_temp, dtype=np.float64)
+    yearmoda = data[:, 0].astype(np.int64) * 10000 + data[:, 1].astype(np.int64) * 100 + data[:, 2].astype(np.int64)
+    stats = group_stats(yearmoda, data[:, 3], by="month")
+    return stats["mean"].tolist(), stats["std"].tolist()
+
+def plot_data_task1(wyear, wtemp, month_mean, month_std):
+    """
+    Create plot for Task 1.
+    :param: wyear: list with year (in decimal)
+    :param: wtemp: temperature per
+    :param: month_mean: list with month's mean values
+    :param: month_std: list with month's mean standard dev values
+    """
+    # Create canvas with two subplots
+    plt.figure()
+    plt.subplot(2, 1, 1)                # select first subplot
+    plt.title("Temperatures at Ogden")
+    plt.plot(wyear, wtemp, "bo")
+    plt.ylabel("Temperature, F")
+    plt.xlabel("Decimal Year")
+
+    plt.subplot(2, 1, 2)                # select second subplot
+    plt.ylabel("Temperature, F")
+    months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun",
+              "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+    monthNumber = list(range(1, 13, 1))
+    plt.xlim([0.7, 13])
+    plt.ylim([0, 90])
+    width = 0.8
+    plt.bar(monthNumber, month_mean, yerr=month_std, width=width,
+            color="lightgreen", ecolor="black", linewidth=1.5)
+    plt.xticks(monthNumber, months)
+    plt.show()      # display plot
+
+def calc_min_max(wdates_min_max):
+    """
+    Function that finds the min and max temperature for each year and then returns it as a list.
+    :param: wdates_min_max: list that contains the year, min, and max temperatures
+    :returns: year_min_max: list with the min and max temperature of each year
+    """
+    data = np.asarray(wdates_min_max, dtype=np.float64)
+    yearmoda = data[:, 0].astype(np.int64) * 10000 + 101    # only the year is needed for grouping
+    min_stats = group_stats(yearmoda, data[:, 1], by="year")
+    max_stats = group_stats(yearmoda, data[:, 2], by="year")
+    return year_min_max_table(min_stats, max_stats)
+
+
+ROLLING_WINDOWS = (7, 30, 365)     # window lengths in days
+
+
+def yearmoda_to_days(yearmoda):
+    """
+    Convert YYYYMMDD integers to numpy dates
+    :param yearmoda: array of dates as YYYYMMDD integers
+    :return: array of datetime64[D]
+    """
+    yearmoda = np.asarray(yearmoda, dtype=np.int64)
+    months = (yearmoda // 10000 - 1970) * 12 + yearmoda // 100 % 100 - 1
+    return months.astype("datetime64[M]").astype("datetime64[D]") + (yearmoda % 100 - 1)
+
+
+def days_to_yearmoda(days):
+    """
+    Convert numpy dates back to YYYYMMDD integers
+    :param days: array of datetime64[D]
+    :return: array of int64 dates
+    """
+    months = days.astype("datetime64[M]")
+    years = months.astype("datetime64[Y]")
+    day = (days - months).astype(np.int64) + 1
+    month = (months - years).astype(np.int64) + 1
+    return (years.astype(np.int64) + 1970) * 10000 + month * 100 + day
+
+
+def _rolling_extreme(day_values, has_value, window, take_max):
+    """
+    Sliding window min or max with a monotonic deque: every day is pushed and popped at most
+    once, so the cost does not depend on the window length
+    :param day_values: value of every day of the grid
+    :param has_value: False for days without a valid value
+    :param window: window length in days
+    :param take_max: True for the max, False for the min
+    :return: array with the extreme of the window ending on every day (nan if the window is empty)
+    """
+    values = day_values.tolist()
+    valid = has_value.tolist()
+    extreme = np.full(len(values), np.nan)
+    candidates = deque()    # day indexes whose values are monotonic, best one on the left
+    for i in range(len(values)):
+        if valid[i]:
+            value = values[i]
+            if take_max:
+                while candidates and values[candidates[-1]] <= value:
+                    candidates.pop()
+            else:
+                while candidates and values[candidates[-1]] >= value:
+                    candidates.pop()
+            candidates.append(i)
+        while candidates and candidates[0] <= i - window:
+            candidates.popleft()
+        if candidates:
+            extreme[i] = values[candidates[0]]
+    return extreme
+
+
+def rolling_stats(yearmoda, values, window, missing=GSOD_MISSING["temp"], min_count=1):
+    """
+    Moving window count, mean, standard deviation, min and max over calendar days.
+    Sums come from prefix sums and extremes from a monotonic deque, so any window length is O(n).
+    Missing days and values equal to missing (the GSOD sentinel of the column) are left out of the windows.
+    :param yearmoda: array of dates as YYYYMMDD integers, in increasing order
+    :param values: array of values, one per date
+    :param window: window length in days, the window ends on (and includes) each day
+    :param missing: value that marks a missing measurement, see GSOD_MISSING; None keeps everything
+    :param min_count: windows with fewer valid values than this get nan stats
+    :return: dictionary of arrays keyed by "yearmoda", "count", "mean", "std", "min" and "max",
+             with one entry for every calendar day from the first to the last date
+    """
+    days = yearmoda_to_days(yearmoda)
+    values = np.asarray(values, dtype=np.float64)
+    valid = np.isfinite(values)
+    if missing is not None:
+        valid &= values != missing
+    if days.size == 0:
+        empty = np.empty(0)
+        return {"yearmoda": np.empty(0, dtype=np.int64), "count": np.empty(0, dtype=np.int64),
+                "mean": empty, "std": empty, "min": empty, "max": empty}
+
+    first_day = days[0]
+    position = (days - first_day).astype(np.int64)[valid]
+    values = values[valid]
+    size = int((days[-1] - first_day).astype(np.int64)) + 1
+
+    # per day totals on a gap free grid, shifted by the overall mean to keep the variance accurate
+    shift = values.mean() if values.size else 0.0
+    day_count = np.bincount(position, minlength=size)
+    day_sum = np.bincount(position, weights=values - shift, minlength=size)
+    day_sumsq = np.bincount(position, weights=(values - shift)**2, minlength=size)
+
+    def window_total(day_total):
+        prefix = np.concatenate(([0], np.cumsum(day_total)))
+        end = np.arange(1, size + 1)
+        return prefix[end] - prefix[np.maximum(end - window, 0)]
+
+    count = window_total(day_count)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_shifted = window_total(day_sum) / count
+        std = np.sqrt(np.maximum(window_total(day_sumsq) / count - mean_shifted**2, 0.0))
+    mean = mean_shifted + shift
+
+    has_value = day_count > 0
+    day_min = np.full(size, np.inf)
+    day_max = np.full(size, -np.inf)
+    np.minimum.at(day_min, position, values)
+    np.maximum.at(day_max, position, values)
+    minimum = _rolling_extreme(day_min, has_value, window, take_max=False)
+    maximum = _rolling_extreme(day_max, has_value, window, take_max=True)
+
+    too_few = count < max(min_count, 1)
+    for stat in (mean, std, minimum, maximum):
+        stat[too_few] = np.nan
+
+    grid = days_to_yearmoda(first_day + np.arange(size))
+    return {"yearmoda": grid, "count": count, "mean": mean, "std": std, "min": minimum, "max": maximum}
+
+
+def to_yearmoda(value):
+    """
+    Convert a date to a YYYYMMDD integer
+    :param value: YYYYMMDD int, "YYYYMMDD" or "YYYY-MM-DD" string, or datetime.date
+    :return: int date
+    """
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.year * 10000 + value.month * 100 + value.day
+    if isinstance(value, str):
+        return int(value.replace("-", ""))
+    return int(value)
+
+
+class StationData:
+    """
+    The records of one station, kept sorted by YEARMODA so any date range can be found with a
+    binary search and handed out as a view without copying or rescanning the data
+    """
+
+    def __init__(self, records):
+        """
+        :param records: numpy array with GSOD_DTYPE, e.g. from load_gsod
+        """
+        dates = records["yearmoda"]
+        if dates.size > 1 and np.any(dates[1:] < dates[:-1]):
+            records = records[np.argsort(dates, kind="stable")]   # only copies when out of order
+        self.records = records
+        self.dates = records["yearmoda"]
+
+    @classmethod
+    def from_file(cls, infile, cache_dir=None):
+        """
+        :param infile: weather data input file
+        :param cache_dir: cache folder passed on to load_gsod
+        :return: StationData
+        """
+        return cls(load_gsod(infile, cache_dir))
+
+    @classmethod
+    def from_parsed(cls, wdates_and_temp, wdates_min_max):
+        """
+        Build from the two lists returned by parse_data. Columns that parse_data doesn't keep
+        are filled with their GSOD missing value.
+        :param wdates_and_temp: list of [year, month, day, temperature] lists
+        :param wdates_min_max: list of [year, min, max] lists in the same order
+        :return: StationData
+        """
+        dates_temp = np.asarray(wdates_and_temp, dtype=np.float64).reshape(-1, 4)
+        min_max = np.asarray(wdates_min_max, dtype=np.float64).reshape(-1, 3)
+        records = np.zeros(len(dates_temp), dtype=GSOD_DTYPE)
+        for name in GSOD_DTYPE.names:
+            if name in GSOD_MISSING:
+                records[name] = GSOD_MISSING[name]
+        records["yearmoda"] = (dates_temp[:, 0] * 10000 + dates_temp[:, 1] * 100 + dates_temp[:, 2]).astype(np.int32)
+        records["temp"] = dates_temp[:, 3]
+        records["min"] = min_max[:, 1]
+        records["max"] = min_max[:, 2]
+        return cls(records)
+
+    def __len__(self):
+        return self.dates.size
+
+    def _bounds(self, start, end):
+        """
+        :return: the slice indexes of the records from start to end (both included)
+        """
+        low = 0 if start is None else np.searchsorted(self.dates, to_yearmoda(start), side="left")
+        high = self.dates.size if end is None else np.searchsorted(self.dates, to_yearmoda(end), side="right")
+        return low, high
+
+    def query(self, start=None, end=None, fields=None):
+        """
+        Get the records between two dates
+        :param start: first date to include, None for the beginning of the data
+        :param end: last date to include, None for the end of the data
+        :param fields: a column name or list of column names, None for all columns
+        :return: view of the records (no data is copied)
+        """
+        low, high = self._bounds(start, end)
+        window = self.records[low:high]
+        if fields is None:
+            return window
+        if isinstance(fields, str):
+            return window[fields]
+        return window[list(fields)]
+
+    def calc_mean_std_dev(self, start=None, end=None, field="temp"):
+        """
+        Mean and standard deviation per month, like calc_mean_std_dev, for a date range
+        :param start: first date to include
+        :param end: last date to include
+        :param field: column to average, its GSOD_MISSING value is left out
+        :return: means, std_dev: months_mean and std_dev lists
+        """
+        window = self.query(start, end)
+        stats = group_stats(window["yearmoda"], window[field], by="month", missing=GSOD_MISSING.get(field))
+        return stats["mean"].tolist(), stats["std"].tolist()
+
+    def calc_min_max(self, start=None, end=None):
+        """
+        Min and max temperature per year, like calc_min_max, for a date range
+        :param start: first date to include
+        :param end: last date to include
+        :return: year_min_max: list with the year, min and max temperature of each year
+        """
+        window = self.query(start, end)
+        return year_min_max_table(group_stats(window["yearmoda"], window["min"], by="year"),
+                                  group_stats(window["yearmoda"], window["max"], by="year"))
+
+    def rolling(self, field="temp", windows=ROLLING_WINDOWS, start=None, end=None, min_count=1):
+        """
+        Moving window stats of a column for several window lengths, see rolling_stats
+        :param field: column to use ("temp", "max", "min", "slp", "prcp", ...), its GSOD_MISSING
+                      value is left out
+        :param windows: window lengths in days
+        :param start: first date to include
+        :param end: last date to include
+        :param min_count: windows with fewer valid values than this get nan stats
+        :return: dictionary of rolling_stats results keyed by window length
+        """
+        window = self.query(start, end)
+        return {days: rolling_stats(window["yearmoda"], window[field], days, GSOD_MISSING.get(field), min_count)
+                for days in windows}
+
+
+def plot_data_task2(year_min_max):
+    """
+    Function that plots the min and max temperatures for each year
+    :param: year_min_max: list that holds the year and the min and max temperatures for that year
+    """
+    year = np.array(year_min_max)[:,0].tolist()
+    min = np.array(year_min_max)[:,1].tolist()
+    max = np.array(year_min_max)[:,2].tolist()
+    plt.plot(year, min, "bo", label="Minimum Temp")
+    plt.plot(year, max, "ro", label="Maximum Temp")
+    plt.ylabel("Temperature, F")
+    plt.xlabel("Year")
+    plt.title("Min and Max Temperature by Year")
+    plt.legend()
+    plt.show()
+
+
+
+# (column, grouping) pairs collected for every station in batch mode
+STATION_STATS = (("temp", "month"), ("min", "year"), ("max", "year"))
+STATS_TABLE_DTYPE = np.dtype([
+    ("station", "U12"), ("field", "U4"), ("by", "U10"), ("key", "i8"), ("count", "i8"),
+    ("mean", "f8"), ("std", "f8"), ("min", "f8"), ("max", "f8"),
+])
+
+
+def find_station_files(source):
+    """
+    Find the GSOD station files to process
+    :param source: a directory (every file in it starting with a GSOD header) or a glob pattern
+    :return: sorted list of file paths
+    """
+    if os.path.isdir(source):
+        files = []
+        for name in sorted(os.listdir(source)):
+            path = os.path.join(source, name)
+            if name.startswith(".") or not os.path.isfile(path):
+                continue
+            with open(path, mode='r', errors='replace') as file:
+                if file.readline().startswith("STN"):
+                    files.append(path)
+        return files
+    return sorted(glob.glob(source))
+
+
+def station_name(records):
+    """
+    :param records: numpy array with GSOD_DTYPE
+    :return: "STN-WBAN" id of the station of the first record, zero padded as in the GSOD files,
+             or "" if there are no records
+    """
+    if not records.size:
+        return ""
+    return "{:06d}-{:05d}".format(records["stn"][0], records["wban"][0])
+
+
+def station_stats(infile, batch_size=100000):
+    """
+    Compute the STATION_STATS accumulators for one station, streaming the file in batches so
+    memory use does not depend on its size. Runs in the worker processes.
+    :param infile: weather data input file
+    :param batch_size: number of lines parsed per batch
+    :return: station: "STN-WBAN" name of the station (the file name if it has no records)
+             stats: dictionary of RunningStats keyed by (column, grouping)
+    """
+    with open(infile, mode='r') as file:
+        next(file, None)    # header line
+        station = station_name(parse_gsod_lines(itertools.islice(file, 1))) or os.path.basename(infile)
+    monthly, yearly_min, yearly_max = stream_station_stats(infile, batch_size)
+    stats = {("temp", "month"): monthly, ("min", "year"): yearly_min, ("max", "year"): yearly_max}
+    return station, stats
+
+
+def stats_table(station_results):
+    """
+    Merge per-station results into one table. Rows for the station "ALL" hold the stats of all
+    stations combined.
+    :param station_results: list of (station, stats) tuples from station_stats
+    :return: numpy array with STATS_TABLE_DTYPE (the station column is wider if a name needs it)
+    """
+    combined = {(field, by): RunningStats(by=by, missing=GSOD_MISSING[field]) for field, by in STATION_STATS}
+    rows = []
+    for station, stats in station_results:
+        for field, by in STATION_STATS:
+            combined[(field, by)].merge(stats[(field, by)])
+    for station, stats in list(station_results) + [("ALL", combined)]:
+        for field, by in STATION_STATS:
+            result = stats[(field, by)].result()
+            for i in range(result["key"].size):
+                rows.append((station, field, by, result["key"][i], result["count"][i], result["mean"][i],
+                             result["std"][i], result["min"][i], result["max"][i]))
+    # widen the station column for names longer than a STN-WBAN id (file names of empty stations)
+    width = max([12] + [len(row[0]) for row in rows])
+    dtype = np.dtype([("station", "U{}".format(width))] + STATS_TABLE_DTYPE.descr[1:])
+    return np.array(rows, dtype=dtype)
+
+
+def _state_path(infile, cache_dir=None):
+    """
+    :param infile: weather data input file
+    :param cache_dir: folder for the state file, defaults to GSOD_CACHE_DIR next to infile
+    :return: path of the incremental state file of infile
+    """
+    path = os.path.abspath(infile)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(path), GSOD_CACHE_DIR)
+    return os.path.join(cache_dir, os.path.basename(path) + ".state.npz")
+
+
+def _file_prefix_hash(file, length):
+    """
+    Hash the first length bytes of an open binary file. Used to notice a file that was
+    replaced instead of appended to.
+    """
+    file.seek(0)
+    return hashlib.sha1(file.read(length)).hexdigest()
+
+
+def update_station_stats(infile, state_file=None, batch_size=100000):
+    """
+    Bring the STATION_STATS of a growing station file up to date. The byte offset reached and the
+    accumulator state are saved after every call, so the next call only parses lines appended since.
+    If the file got shorter or its beginning changed everything is recomputed.
+    :param infile: weather data input file
+    :param state_file: where to keep the state, defaults to a file in GSOD_CACHE_DIR next to infile
+    :param batch_size: number of new lines parsed at a time
+    :return: station: "STN-WBAN" name of the station
+             stats: dictionary of RunningStats keyed by (column, grouping)
+    """
+    if state_file is None:
+        state_file = _state_path(infile)
+    head_length = 4096  # bytes hashed to check that the file was only appended to
+
+    with open(infile, mode='rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        offset = 0
+        station = ""
+        if os.path.exists(state_file):
+            with np.load(state_file) as state:
+                if (int(state["offset"]) <= size and
+                        str(state["head_hash"]) == _file_prefix_hash(file, min(head_length, int(state["offset"])))):
+                    offset = int(state["offset"])
+                    station = str(state["station"])
+                    stats = {(field, by): RunningStats.from_arrays(state, "{}_{}_".format(field, by))
+                             for field, by in STATION_STATS}
+        if offset == 0:
+            stats = {(field, by): RunningStats(by=by, missing=GSOD_MISSING[field]) for field, by in STATION_STATS}
+
+        file.seek(offset)
+        if offset == 0:
+            offset += len(file.readline())      # header line
+        while True:
+            lines = []
+            for line in itertools.islice(file, batch_size):
+                if not line.endswith(b"\n"):
+                    break       # the last line is still being written, pick it up next time
+                lines.append(line.decode("ascii", errors="replace"))
+                offset += len(line)
+            if not lines:
+                break
+            records = parse_gsod_lines(lines)
+            if not station:
+                station = station_name(records)
+            for field, by in STATION_STATS:
+                stats[(field, by)].update(records["yearmoda"], records[field])
+            if len(lines) < batch_size:
+                break
+        head_hash = _file_prefix_hash(file, min(head_length, offset))
+
+    state = {"offset": np.array(offset), "head_hash": np.array(head_hash), "station": np.array(station)}
+    for field, by in STATION_STATS:
+        state.update(stats[(field, by)].to_arrays("{}_{}_".format(field, by)))
+    os.makedirs(os.path.dirname(os.path.abspath(state_file)), exist_ok=True)
+    tmp_file = state_file + ".tmp"
+    with open(tmp_file, mode='wb') as file:
+        np.savez(file, **state)
+    os.replace(tmp_file, state_file)
+    return station, stats
+
+
+def batch_station_stats(source, workers=None, batch_size=100000):
+    """
+    Process many station files in parallel and combine their monthly and yearly statistics
+    :param source: directory or glob pattern of station files
+    :param workers: number of worker processes, defaults to the number of CPUs
+    :param batch_size: number of lines each worker parses at a time
+    :return: numpy array with STATS_TABLE_DTYPE
+    """
+    files = find_station_files(source)
+    if not files:
+        raise FileNotFoundError("no GSOD station files found in {}".format(source))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # hand out several files per task so small stations don't spend all their time in IPC
+        chunksize = max(1, len(files) // (4 * (workers or os.cpu_count() or 1)))
+        results = list(pool.map(station_stats, files, itertools.repeat(batch_size), chunksize=chunksize))
+    return stats_table(results)
+
+
+def write_stats_table(table, outfile):
+    """
+    Save a stats table as a csv file
+    :param table: numpy array with STATS_TABLE_DTYPE
+    :param outfile: name of the csv file
+    :return: Nothing
+    """
+    np.savetxt(outfile, table, delimiter=",", header=",".join(table.dtype.names), comments="",
+               fmt=["%s", "%s", "%s", "%d", "%d", "%.3f", "%.3f", "%.1f", "%.1f"])
+
+
+def main(infile):
+    weather_data = infile    # take data file as input parameter to file
+    wdates_and_temp, wdates_min_max = parse_data(weather_data)
+    # Calculate mean and standard dev per month
+    month_mean, month_std = calc_mean_std_dev(wdates_and_temp)
+    #               1) years,                                 2) temperature,                       3) month_mean, 4) month_std
+    plot_data_task1(np.array(wdates_and_temp)[:,0].tolist(), np.array(wdates_and_temp)[:,-1].tolist(), month_mean, month_std)
+    year_min_max = calc_min_max(wdates_min_max)
+    plot_data_task2(year_min_max)
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze GSOD weather data")
+    parser.add_argument("infile", nargs="?", default='data/CDO6674605799016.txt', help="station data file")
+    parser.add_argument("--batch", action="store", dest="batch", help="directory or glob of station files to process in parallel")
+    parser.add_argument("--workers", action="store", dest="workers", type=int, default=None, help="number of worker processes for --batch")
+    parser.add_argument("--incremental", action="store_true", dest="incremental", help="only parse lines appended since the last run of infile")
+    parser.add_argument("--stream", action="store_true", dest="stream", help="compute the stats table of infile in bounded memory, a batch of lines at a time")
+    parser.add_argument("--batch-size", action="store", dest="batch_size", type=int, default=100000, help="lines parsed at a time by --stream, --batch and --incremental")
+    parser.add_argument("--output", action="store", dest="output", default="station_stats.csv", help="csv file written by --batch, --stream and --incremental")
+    args = parser.parse_args()
+
+    if args.batch:
+        write_stats_table(batch_station_stats(args.batch, args.workers, args.batch_size), args.output)
+    elif args.stream:
+        write_stats_table(stats_table([station_stats(args.infile, args.batch_size)]), args.output)
+    elif args.incremental:
+        write_stats_table(stats_table([update_station_stats(args.infile, batch_size=args.batch_size)]), args.output)
+    else:
+        main(args.infile)
@@ -5,104 +5,376 @@ so the data needed to be interpolated. There is also a lot of extra data from wh
 was on the ground after that was stripped off. The data is then graphed.
 """
 import sys
+import os
+import argparse
 import matplotlib.pyplot as plt
 import numpy as np
 import scipy
+from scipy.interpolate import CubicSpline
 import pandas as pd
 import csv
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime as dt
 
+def decode_wx_timestamps(dates, times, millisecs):
+    """
+    Turn the Date (MM/DD/YYYY), Time (HH:MM:SS) and millisecs columns of the weather logger into
+    seconds since the first sample, for all rows at once.
+    If the clock passes midnight without the date changing, a day is added from that point on.
+    :param dates: array of date strings
+    :param times: array of time strings
+    :param millisecs: array of milliseconds past the second
+    :return: numpy float64 array of elapsed seconds
+    """
+    stamps = pd.to_datetime(pd.Series(dates, dtype=str) + " " + pd.Series(times, dtype=str),
+                            format="%m/%d/%Y %H:%M:%S")
+    whole_seconds = (stamps - stamps.iloc[0]).dt.total_seconds().to_numpy(dtype=np.float64)
+    seconds = whole_seconds + np.asarray(millisecs, dtype=np.float64) / 1000.0
+    seconds -= seconds[0]
+    # a jump back of more than half a day can only be the clock rolling over midnight
+    rollovers = np.cumsum(np.diff(seconds, prepend=seconds[0]) < -43200)
+    return seconds + rollovers * 86400.0
+
 def read_wx_data(wx_file, harbor_data):
     """
     Read temperature and time data from file.
-    Populates the harbor_data dictionary with two lists: wx_times and wx_temperatures
+    Populates the harbor_data dictionary with two arrays: wx_times (hours since the first sample)
+    and wx_temperatures
     :param wx_file: File object with data
     :param harbor_data: A dictionary to collect data.
     :return: Nothing
     """
-    data = pd.read_csv(wx_file, usecols=[1,3]) # reads in the time and temperature columns into a pandas dataframe
-    times = data["Time"].values
-    startTime = dt.strptime(times[0], '%H:%M:%S') # first time in file used to find delta time
-    harbor_data["wx_times"] = []
-    for time in times:
-        delta_t = dt.strptime(time,'%H:%M:%S') - startTime
-        harbor_data['wx_times'].append(float(delta_t.total_seconds()/3600))
-    harbor_data["wx_temperatures"] = data["Ch1:Deg F"].tolist()
-    for temp in harbor_data["wx_temperatures"]:
-        temp = float(temp)
+    data = pd.read_csv(wx_file, usecols=["Date", "Time", "millisecs", "Ch1:Deg F"],
+                       dtype={"Date": str, "Time": str, "millisecs": np.float64, "Ch1:Deg F": np.float64})
+    seconds = decode_wx_timestamps(data["Date"].to_numpy(), data["Time"].to_numpy(), data["millisecs"].to_numpy())
+    harbor_data["wx_times"] = seconds / 3600
+    harbor_data["wx_temperatures"] = data["Ch1:Deg F"].to_numpy()
+
+# columns of the tab separated gps log (after its two header lines)
+GPS_DTYPE = np.dtype([("hours", "f8"), ("min", "f8"), ("sec", "f8"), ("met", "f8"),
+                      ("lon", "f8"), ("lat", "f8"), ("alt", "f8")])
+GPS_SIDECAR_SUFFIX = ".gps.npy"     # binary copy saved next to the gps log
+
+def _sidecar_path(gps_file):
+    """
+    Name of the sidecar of a gps log. It includes the size and modification time of the log,
+    so a log that was edited or replaced (even by an older copy) never uses a stale sidecar.
+    :param gps_file: gps data file
+    :return: path of the sidecar file
+    """
+    info = os.stat(gps_file)
+    return "{}.{}-{}{}".format(gps_file, info.st_size, info.st_mtime_ns, GPS_SIDECAR_SUFFIX)
+
+def load_gps(gps_file, use_cache=True):
+    """
+    Load the gps log as a numpy structured array with GPS_DTYPE columns.
+    The first load parses the text and saves a binary sidecar file next to it; later loads
+    memory-map the sidecar as long as the log has the same size and modification time. The
+    sidecar is skipped when it cannot be written (read-only folder).
+    :param gps_file: gps data file
+    :param use_cache: set to False to always parse the text
+    :return: numpy structured array, one record per gps fix
+    """
+    sidecar = _sidecar_path(gps_file)
+    if use_cache and os.path.exists(sidecar):
+        return np.load(sidecar, mmap_mode='r')
+    records = np.loadtxt(gps_file, dtype=GPS_DTYPE, skiprows=2, ndmin=1)
+    if use_cache:
+        tmp_file = sidecar + ".tmp"
+        try:
+            # remove the sidecars of older versions of the log
+            folder = os.path.dirname(os.path.abspath(gps_file))
+            prefix = os.path.basename(gps_file) + "."
+            for name in os.listdir(folder):
+                key = name[len(prefix):-len(GPS_SIDECAR_SUFFIX)]
+                if (name.startswith(prefix) and name.endswith(GPS_SIDECAR_SUFFIX)
+                        and key.count("-") == 1 and key.replace("-", "").isdigit()):
+                    os.remove(os.path.join(folder, name))
+            with open(tmp_file, mode='wb') as file:
+                np.save(file, records)
+            os.replace(tmp_file, sidecar)
+        except OSError:
+            pass    # read-only folder, the parsed records are still good
+    return records
 
 def read_gps_data(gps_file, harbor_data):
     """
     Read gps and altitude data from file.
-    Populates the harbor_data dictionary with two lists: gps_times and gps_altitude
+    Populates the harbor_data dictionary with four arrays: gps_times (hours since the first fix),
+    gps_altitude, gps_latitude and gps_longitude
     :param gps_file: File object with gps data
     :param harbor_data: A dictionary to collect data.
     :return: Nothing
     """
-    hours = [] # list to hold the times converted to hours
-    altitude = [] # list to hold the altitudes from the file
-    with open(gps_file, newline = '') as tabFile:
-        tabFile = csv.reader(tabFile, delimiter='\t')
-        next(tabFile, None)
-        next(tabFile, None)
-        firstLine = next(tabFile)
-        startingTime = float(firstLine[0]) + (float(firstLine[1])/60) + (float(firstLine[2])/3600)
-        hours.append(0.0)
-        altitude.append(float(firstLine[6]))
-        for line in tabFile:
-            hours.append(float(line[0]) + (float(line[1])/60) + (float(line[2])/3600) - startingTime)
-            altitude.append(float(line[6]))
-    harbor_data["gps_times"] = hours
-    harbor_data["gps_altitude"] = altitude
-
-def interpolate_wx_from_gps(harbor_data):
+    records = load_gps(gps_file)
+    hours = records["hours"] + records["min"]/60 + records["sec"]/3600
+    harbor_data["gps_times"] = hours - hours[0]
+    harbor_data["gps_altitude"] = np.array(records["alt"])
+    harbor_data["gps_latitude"] = np.array(records["lat"])
+    harbor_data["gps_longitude"] = np.array(records["lon"])
+
+def interpolate_altitude(times, gps_times, gps_altitude, kind="linear"):
+    """
+    Interpolate altitudes at the given times from the gps track.
+    Each time is placed on the track with a binary search, so the whole array is done in one pass.
+    Times before the first gps fix get the first altitude.
+    :param times: sorted array of times to find the altitude for
+    :param gps_times: sorted array of gps times
+    :param gps_altitude: altitude at each gps time
+    :param kind: "linear" or "cubic" (cubic spline through the gps fixes)
+    :return: numpy array of altitudes, same length as times
+    """
+    times = np.asarray(times, dtype=np.float64)
+    gps_times = np.asarray(gps_times, dtype=np.float64)
+    gps_altitude = np.asarray(gps_altitude, dtype=np.float64)
+    clipped = np.clip(times, gps_times[0], gps_times[-1])
+    if kind == "cubic" and gps_times.size > 2:
+        return CubicSpline(gps_times, gps_altitude)(clipped)
+    if kind not in ("linear", "cubic"):
+        raise ValueError("kind must be 'linear' or 'cubic', not {!r}".format(kind))
+    # index of the gps fix at or after each time, kept inside the track
+    upper = np.clip(np.searchsorted(gps_times, clipped, side="left"), 1, gps_times.size - 1)
+    lower = upper - 1
+    span = gps_times[upper] - gps_times[lower]
+    fraction = np.divide(clipped - gps_times[lower], span, out=np.zeros_like(clipped), where=span > 0)
+    return gps_altitude[lower] + fraction * (gps_altitude[upper] - gps_altitude[lower])
+
+def interpolate_wx_from_gps(harbor_data, kind="linear"):
     """
     Compute wx altitudes by interpolating from gps altitudes
-    Populates the harbor_data dictionary with four lists:
+    Weather samples taken after the last gps fix are dropped.
+    Populates the harbor_data dictionary with five arrays:
         1) wx correlated altitude up
         2) wx correlated temperature up
         3) wx correlated altitude down
         4) wx correlated temperature down
         5) wx correlated altitude
     :param harbor_data: A dictionary to collect data.
+    :param kind: "linear" or "cubic" interpolation between gps fixes
     :return: Nothing
     """
-    wx_correlated_alt = [] # list to hold all of the correlated altitudes to be used for first plot
-    cutoff_index = 0 # variable to hold the index where the wx_times is over the max gps_times
-    max_gps_time = max(harbor_data['gps_times']) # used for cutting out the extra data from the wx data that is past this time
-    count_to_add = 0 # variable to keep track of how many numbers need to be added inbetween alt values for interpolation
-    index = 0 # index used for the gps data while looping through the wx_times data
-    for time in harbor_data["wx_times"]:
-        if time > max_gps_time:
-            wx_correlated_alt.extend(np.linspace(harbor_data["gps_altitude"][index - 1],
-                                        harbor_data["gps_altitude"][index],
-                                        num=count_to_add)) 
-            break
-        if(time > harbor_data["gps_times"][index]):
-            if index == 0:
-                wx_correlated_alt.extend(np.linspace(harbor_data["gps_altitude"][index], harbor_data["gps_altitude"][index], num=count_to_add + 1)) # this may make the len incorrect
-            else:
-                wx_correlated_alt.extend(np.linspace(harbor_data["gps_altitude"][index - 1], harbor_data["gps_altitude"][index], num=count_to_add + 1)) # this may make the len incorrect
-            count_to_add = 0
-            index += 1
-        else:
-            count_to_add +=1
-        cutoff_index += 1
-    
-    harbor_data["wx_times"] = harbor_data["wx_times"][:cutoff_index]
-    harbor_data["wx_temperatures"] = harbor_data["wx_temperatures"][:cutoff_index]
+    wx_times = np.asarray(harbor_data["wx_times"], dtype=np.float64)
+    max_gps_time = np.max(harbor_data["gps_times"]) # used for cutting out the extra data from the wx data that is past this time
+    cutoff_index = np.searchsorted(wx_times, max_gps_time, side="right") # first wx time past the gps data
+
+    harbor_data["wx_times"] = wx_times[:cutoff_index]
+    harbor_data["wx_temperatures"] = np.asarray(harbor_data["wx_temperatures"], dtype=np.float64)[:cutoff_index]
+    wx_correlated_alt = interpolate_altitude(harbor_data["wx_times"], harbor_data["gps_times"],
+                                             harbor_data["gps_altitude"], kind)
 
-    index_max_alt = wx_correlated_alt.index(max(wx_correlated_alt))
+    index_max_alt = int(np.argmax(wx_correlated_alt))
     harbor_data["wx_correlated_alt"] = wx_correlated_alt
     harbor_data["wx_correlated_alt_up"] = wx_correlated_alt[:index_max_alt + 1]
     harbor_data["wx_correlated_alt_down"] = wx_correlated_alt[index_max_alt:]
     harbor_data["wx_correlated_temp_up"] = harbor_data["wx_temperatures"][:index_max_alt + 1]
     harbor_data["wx_correlated_temp_down"] = harbor_data["wx_temperatures"][index_max_alt:]
 
-def plot_figs(harbor_data):
+class FileTail:
+    """
+    Follows a file that is still being written and hands back only the complete lines added
+    since the last read
+    """
+
+    def __init__(self, path, skip_lines=0):
+        """
+        :param path: file to follow
+        :param skip_lines: number of header lines to throw away
+        """
+        self.path = path
+        self.offset = 0
+        self.partial = b""  # start of a line that has not been finished yet
+        self.skip_lines = skip_lines
+
+    def read_lines(self):
+        """
+        :return: list of the new complete lines (without line endings)
+        """
+        try:
+            with open(self.path, mode='rb') as file:
+                file.seek(self.offset)
+                chunk = file.read()
+        except FileNotFoundError:
+            return []
+        self.offset += len(chunk)
+        lines = (self.partial + chunk).split(b"\n")
+        self.partial = lines.pop()
+        lines = [line.decode("ascii", errors="replace").rstrip("\r") for line in lines]
+        if self.skip_lines:
+            skipped = min(self.skip_lines, len(lines))
+            self.skip_lines -= skipped
+            lines = lines[skipped:]
+        return [line for line in lines if line.strip()]
+
+class LiveFlight:
+    """
+    Aligns weather samples to the gps altitude while both logs are still growing.
+    Gps fixes are only kept until the weather samples have moved past them, and weather samples
+    newer than the last fix wait in a queue until a later fix arrives, so every line costs
+    (amortized) constant time. The index of the highest sample (the ascent/descent split) is
+    kept up to date as samples come in.
+    """
+
+    def __init__(self, wx_file, gps_file):
+        """
+        :param wx_file: TempPressure.txt style weather log
+        :param gps_file: GPSData.txt style gps log
+        """
+        self.wx_tail = FileTail(wx_file, skip_lines=1)
+        self.gps_tail = FileTail(gps_file, skip_lines=2)
+        self.wx_start = None    # (timestamp, milliseconds) of the first weather sample
+        self.wx_day_offset = 0.0
+        self.last_wx_seconds = 0.0
+        self.gps_start = None   # hours of the first gps fix
+        self.fixes = deque()    # (hours, altitude) gps fixes from the one before the last aligned sample on
+        self.pending = deque()  # (hours, temperature) samples newer than the last fix
+        self.wx_times = []
+        self.wx_temperatures = []
+        self.wx_correlated_alt = []
+        self.max_alt = -np.inf
+        self.index_max_alt = -1
+
+    def _add_gps_line(self, line):
+        values = line.split()
+        hours = float(values[0]) + float(values[1])/60 + float(values[2])/3600
+        if self.gps_start is None:
+            self.gps_start = hours
+        self.fixes.append((hours - self.gps_start, float(values[6])))
+        while self.pending and self.pending[0][0] <= self.fixes[-1][0]:
+            self._align(*self.pending.popleft())
+
+    def _add_wx_line(self, line):
+        values = line.split(",")
+        stamp = dt.strptime(values[0] + " " + values[1], "%m/%d/%Y %H:%M:%S")
+        millisecs = float(values[2])
+        if self.wx_start is None:
+            self.wx_start = (stamp, millisecs)
+        seconds = (stamp - self.wx_start[0]).total_seconds() + (millisecs - self.wx_start[1])/1000 + self.wx_day_offset
+        if seconds < self.last_wx_seconds - 43200:  # clock rolled over midnight without the date changing
+            self.wx_day_offset += 86400
+            seconds += 86400
+        self.last_wx_seconds = seconds
+        sample = (seconds/3600, float(values[3]))
+        if self.pending or not self.fixes or sample[0] > self.fixes[-1][0]:
+            self.pending.append(sample)
+        else:
+            self._align(*sample)
+
+    def _align(self, hours, temperature):
+        """
+        Interpolate the altitude of one sample from the fixes around it and record it
+        """
+        while len(self.fixes) > 1 and self.fixes[1][0] < hours:
+            self.fixes.popleft()    # samples only move forward, so this fix is never needed again
+        if len(self.fixes) == 1 or hours <= self.fixes[0][0]:
+            altitude = self.fixes[0][1]     # before the first fix
+        else:
+            (t0, a0), (t1, a1) = self.fixes[0], self.fixes[1]
+            altitude = a0 + (a1 - a0) * (hours - t0) / (t1 - t0) if t1 > t0 else a1
+        self.wx_times.append(hours)
+        self.wx_temperatures.append(temperature)
+        self.wx_correlated_alt.append(altitude)
+        if altitude > self.max_alt:
+            self.max_alt = altitude
+            self.index_max_alt = len(self.wx_correlated_alt) - 1
+
+    def poll(self):
+        """
+        Read whatever has been added to the two logs and align it
+        :return: number of new aligned samples
+        """
+        aligned = len(self.wx_times)
+        for line in self.gps_tail.read_lines():
+            self._add_gps_line(line)
+        for line in self.wx_tail.read_lines():
+            self._add_wx_line(line)
+        return len(self.wx_times) - aligned
+
+    def harbor_data(self):
+        """
+        :return: a harbor_data dictionary like the one interpolate_wx_from_gps fills in,
+                 for the samples aligned so far
+        """
+        split = self.index_max_alt
+        harbor_data = {"wx_times": np.array(self.wx_times),
+                       "wx_temperatures": np.array(self.wx_temperatures),
+                       "wx_correlated_alt": np.array(self.wx_correlated_alt)}
+        harbor_data["wx_correlated_alt_up"] = harbor_data["wx_correlated_alt"][:split + 1]
+        harbor_data["wx_correlated_alt_down"] = harbor_data["wx_correlated_alt"][split:]
+        harbor_data["wx_correlated_temp_up"] = harbor_data["wx_temperatures"][:split + 1]
+        harbor_data["wx_correlated_temp_down"] = harbor_data["wx_temperatures"][split:]
+        return harbor_data
+
+def follow_flight(wx_file, gps_file, poll_interval=1.0, idle_timeout=None):
+    """
+    Watch a flight live. Yields the LiveFlight every time new samples have been aligned.
+    :param wx_file: weather log that is being written
+    :param gps_file: gps log that is being written
+    :param poll_interval: seconds to wait between looking at the files
+    :param idle_timeout: stop after this many seconds without new data, None to run forever
+    :return: generator of LiveFlight
+    """
+    flight = LiveFlight(wx_file, gps_file)
+    idle = 0.0
+    while idle_timeout is None or idle < idle_timeout:
+        if flight.poll():
+            idle = 0.0
+            yield flight
+        else:
+            time.sleep(poll_interval)
+            idle += poll_interval
+
+def watch_flight(wx_file, gps_file, poll_interval=1.0, idle_timeout=None):
+    """
+    Follow a flight while its logs are being written: print the current altitude and the
+    ascent/descent split after every update and redraw the live temperature profiles.
+    When the logs stop growing for idle_timeout seconds the usual figures are shown.
+    :param wx_file: weather log that is being written
+    :param gps_file: gps log that is being written
+    :param poll_interval: seconds to wait between looking at the files
+    :param idle_timeout: stop after this many seconds without new data, None to run until interrupted
+    :return: the final harbor_data dictionary (None if no samples were aligned)
+    """
+    plt.ion()
+    figure, (ax_up, ax_down) = plt.subplots(1, 2, sharey=True)
+    ax_up.set_title("Ascent")
+    ax_down.set_title("Descent")
+    ax_up.set_ylabel("Altitude, Ft")
+    for ax in (ax_up, ax_down):
+        ax.set_xlabel("Temperature, F")
+    line_up, = ax_up.plot([], [])
+    line_down, = ax_down.plot([], [])
+
+    harbor_data = None
+    try:
+        for flight in follow_flight(wx_file, gps_file, poll_interval, idle_timeout):
+            harbor_data = flight.harbor_data()
+            last = len(flight.wx_times) - 1
+            phase = "ascending" if flight.index_max_alt == last else "descending"
+            print("{:.3f} h: {:.0f} ft, max {:.0f} ft at {:.3f} h ({}, {} samples)".format(
+                flight.wx_times[-1], flight.wx_correlated_alt[-1], flight.max_alt,
+                flight.wx_times[flight.index_max_alt], phase, last + 1))
+            line_up.set_data(harbor_data["wx_correlated_temp_up"], harbor_data["wx_correlated_alt_up"])
+            line_down.set_data(harbor_data["wx_correlated_temp_down"], harbor_data["wx_correlated_alt_down"])
+            for ax in (ax_up, ax_down):
+                ax.relim()
+                ax.autoscale_view()
+            plt.pause(0.001)
+    except KeyboardInterrupt:
+        pass
+    plt.ioff()
+    plt.close(figure)
+    if harbor_data is not None:
+        plot_figs(harbor_data)
+    return harbor_data
+
+def plot_figs(harbor_data, save_prefix=None):
     """
     Plot 2 figures with 2 subplots each.
     :param harbor_data: A dictionary to collect data.
+    :param save_prefix: if given, the figures are saved as <save_prefix>_flight.png and
+                        <save_prefix>_profile.png instead of being displayed
     :return: nothing
     """
     plt.figure(1)
@@ -115,7 +387,11 @@ def plot_figs(harbor_data):
     plt.ylabel("Altitude, ft")
     plt.xlabel("Mission Elapsed Time, Hours")
     plt.plot(harbor_data["wx_times"], harbor_data["wx_correlated_alt"])
-    plt.show()
+    if save_prefix:
+        plt.savefig(save_prefix + "_flight.png")
+        plt.close()
+    else:
+        plt.show()
 
     plt.figure(2)
     plt.subplot(1, 2, 1)
@@ -129,23 +405,196 @@ def plot_figs(harbor_data):
     plt.xlabel("Temperature, F")
     plt.yticks([20000, 40000, 60000, 80000])
     plt.plot(harbor_data["wx_correlated_temp_down"], harbor_data["wx_correlated_alt_down"])
-    plt.show()
-    
+    if save_prefix:
+        plt.savefig(save_prefix + "_profile.png")
+        plt.close()
+    else:
+        plt.show()
+
+def altitude_profile(altitude, temperature, band=1000.0):
+    """
+    Bin temperatures into altitude bands and get the count, mean and standard deviation of
+    each band in one vectorized pass. Bands start at 0 ft so profiles of different flights line up.
+    :param altitude: altitudes in feet
+    :param temperature: temperature at each altitude
+    :param band: height of each band in feet
+    :return: dictionary of arrays: "altitude" (bottom of each band), "count", "mean" and "std",
+             one entry per band that has data
+    """
+    altitude = np.asarray(altitude, dtype=np.float64)
+    temperature = np.asarray(temperature, dtype=np.float64)
+    if altitude.size == 0:
+        return {"altitude": np.empty(0), "count": np.empty(0, dtype=np.int64), "mean": np.empty(0), "std": np.empty(0)}
+    index = np.floor(altitude / band).astype(np.int64)
+    first = index.min()
+    index -= first
+    count = np.bincount(index)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(index, weights=temperature) / count
+        std = np.sqrt(np.bincount(index, weights=(temperature - mean[index])**2) / count)
+    found = count > 0
+    return {"altitude": (np.arange(count.size) + first)[found] * float(band), "count": count[found],
+            "mean": mean[found], "std": std[found]}
+
+def lapse_profile(harbor_data, band=1000.0):
+    """
+    Altitude binned temperature profiles of the ascent and the descent
+    :param harbor_data: dictionary filled in by interpolate_wx_from_gps
+    :param band: height of each band in feet
+    :return: dictionary with "up" and "down" altitude_profile results
+    """
+    return {"up": altitude_profile(harbor_data["wx_correlated_alt_up"], harbor_data["wx_correlated_temp_up"], band),
+            "down": altitude_profile(harbor_data["wx_correlated_alt_down"], harbor_data["wx_correlated_temp_down"], band)}
+
+def plot_profile(profile, save_prefix=None):
+    """
+    Plot the ascent and descent temperature profiles with one point (and spread) per band
+    :param profile: result of lapse_profile
+    :param save_prefix: if given, the figure is saved as <save_prefix>_bands.png instead of being displayed
+    :return: nothing
+    """
+    plt.figure(3)
+    plt.title("Harbor Temperature by Altitude Band")
+    plt.xlabel("Temperature, F")
+    plt.ylabel("Altitude, Ft")
+    plt.errorbar(profile["up"]["mean"], profile["up"]["altitude"], xerr=profile["up"]["std"], fmt="o-", label="Ascent")
+    plt.errorbar(profile["down"]["mean"], profile["down"]["altitude"], xerr=profile["down"]["std"], fmt="s-", label="Descent")
+    plt.legend()
+    if save_prefix:
+        plt.savefig(save_prefix + "_bands.png")
+        plt.close()
+    else:
+        plt.show()
+
+FLIGHT_SUMMARY_FIELDS = ["flight", "max_altitude_ft", "burst_time_hr",
+                         "ascent_lapse_rate_F_per_1000ft", "descent_lapse_rate_F_per_1000ft"]
+
+def lapse_rate(altitude, temperature):
+    """
+    Least squares slope of temperature against altitude
+    :param altitude: altitudes in feet
+    :param temperature: temperatures in F
+    :return: change in temperature per 1000 ft (nan if there are fewer than 2 points)
+    """
+    if len(altitude) < 2 or np.ptp(altitude) == 0:
+        return np.nan
+    return np.polyfit(np.asarray(altitude, dtype=np.float64), np.asarray(temperature, dtype=np.float64), 1)[0] * 1000
+
+def flight_summary(name, harbor_data):
+    """
+    Summarize one processed flight
+    :param name: name of the flight
+    :param harbor_data: dictionary filled in by interpolate_wx_from_gps
+    :return: dictionary keyed by FLIGHT_SUMMARY_FIELDS
+    """
+    index_max_alt = len(harbor_data["wx_correlated_alt_up"]) - 1
+    return {"flight": name,
+            "max_altitude_ft": float(harbor_data["wx_correlated_alt"][index_max_alt]),
+            "burst_time_hr": float(harbor_data["wx_times"][index_max_alt]),
+            "ascent_lapse_rate_F_per_1000ft": lapse_rate(harbor_data["wx_correlated_alt_up"], harbor_data["wx_correlated_temp_up"]),
+            "descent_lapse_rate_F_per_1000ft": lapse_rate(harbor_data["wx_correlated_alt_down"], harbor_data["wx_correlated_temp_down"])}
+
+def find_flight_pairs(directory):
+    """
+    Find the weather/gps file pairs under a directory. A weather file is any file with
+    "TempPressure" in its name, and its gps file has the same name with "GPSData" instead.
+    :param directory: folder to search (sub folders included)
+    :return: sorted list of (flight name, weather file, gps file) tuples
+    """
+    pairs = []
+    for folder, _, files in os.walk(directory):
+        for name in files:
+            if "TempPressure" not in name:
+                continue
+            gps_name = name.replace("TempPressure", "GPSData")
+            if gps_name not in files:
+                continue
+            # name the flight after its folder and whatever is left of the file name
+            parts = os.path.relpath(folder, directory).split(os.sep)
+            parts.append(os.path.splitext(name)[0].replace("TempPressure", "").strip("_-. "))
+            flight = "_".join(part for part in parts if part not in ("", ".")) or os.path.basename(os.path.abspath(folder))
+            pairs.append((flight, os.path.join(folder, name), os.path.join(folder, gps_name)))
+    return sorted(pairs)
+
+def process_flight(flight, wx_file, gps_file, figure_dir=None):
+    """
+    Read, align and summarize one flight. Runs in the worker processes.
+    :param flight: name of the flight
+    :param wx_file: weather data file
+    :param gps_file: gps data file
+    :param figure_dir: folder to save the figures in, None for no figures
+    :return: dictionary keyed by FLIGHT_SUMMARY_FIELDS
+    """
+    harbor_data = {}
+    read_wx_data(wx_file, harbor_data)
+    read_gps_data(gps_file, harbor_data)
+    interpolate_wx_from_gps(harbor_data)
+    if figure_dir:
+        plt.switch_backend("Agg")   # workers have no display
+        plot_figs(harbor_data, os.path.join(figure_dir, flight))
+        plot_profile(lapse_profile(harbor_data), os.path.join(figure_dir, flight))
+    return flight_summary(flight, harbor_data)
+
+def batch_flights(directory, outfile, figure_dir=None, workers=None):
+    """
+    Process every flight found under a directory in parallel and write one summary table
+    :param directory: folder with the flight files
+    :param outfile: csv file for the summary table
+    :param figure_dir: folder to save the figures in, None for no figures
+    :param workers: number of worker processes, defaults to the number of CPUs
+    :return: list of summary dictionaries
+    """
+    pairs = find_flight_pairs(directory)
+    if not pairs:
+        raise FileNotFoundError("no TempPressure/GPSData file pairs found in {}".format(directory))
+    if figure_dir:
+        os.makedirs(figure_dir, exist_ok=True)
+    flights, wx_files, gps_files = zip(*pairs)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        summaries = list(pool.map(process_flight, flights, wx_files, gps_files, [figure_dir] * len(pairs)))
+    with open(outfile, mode='w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=FLIGHT_SUMMARY_FIELDS)
+        writer.writeheader()
+        writer.writerows(summaries)
+    return summaries
+
 def main():
     """
     Main function
     :return: Nothing
     """
+    parser = argparse.ArgumentParser(description="Harbor balloon flight data")
+    parser.add_argument("wx_file", nargs="?", default="./TempPressure.txt", help="weather data file")
+    parser.add_argument("gps_file", nargs="?", default="./GPSData.txt", help="gps data file")
+    parser.add_argument("--batch", action="store", dest="batch", help="folder of flights to process in parallel")
+    parser.add_argument("--workers", action="store", dest="workers", type=int, default=None, help="number of worker processes for --batch")
+    parser.add_argument("--output", action="store", dest="output", default="flight_summary.csv", help="summary csv written by --batch")
+    parser.add_argument("--figures", action="store", dest="figures", default=None, help="folder for the figures saved by --batch")
+    parser.add_argument("--live", action="store_true", dest="live", help="follow the two logs while they are being written")
+    parser.add_argument("--poll", action="store", dest="poll", type=float, default=1.0, help="seconds between looks at the logs for --live")
+    parser.add_argument("--idle-timeout", action="store", dest="idle_timeout", type=float, default=None, help="stop --live after this many seconds without new data")
+    parser.add_argument("--band", action="store", dest="band", type=float, default=None, help="also plot temperatures binned into altitude bands of this many feet")
+    args = parser.parse_args()
+
+    if args.batch:
+        batch_flights(args.batch, args.output, args.figures, args.workers)
+        return
+    if args.live:
+        harbor_data = watch_flight(args.wx_file, args.gps_file, args.poll, args.idle_timeout)
+        if args.band and harbor_data is not None:
+            plot_profile(lapse_profile(harbor_data, args.band))
+        return
+
     harbor_data = {}
-    #wx_file = sys.argv[1]                   # first program input param
-    wx_file = "./TempPressure.txt"
-    #gps_file = sys.argv[2]                  # second program input param
-    gps_file = "./GPSData.txt"
+    wx_file = args.wx_file                  # first program input param
+    gps_file = args.gps_file                # second program input param
 
     read_wx_data(wx_file, harbor_data)      # collect weather data
     read_gps_data(gps_file, harbor_data)    # collect gps data
     interpolate_wx_from_gps(harbor_data)    # calculate interpolated data
     plot_figs(harbor_data)                  # display figures
+    if args.band:
+        plot_profile(lapse_profile(harbor_data, args.band))
 
 if __name__ == '__main__':
     main()
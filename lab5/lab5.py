@@ -2,6 +2,9 @@ from vpython import *
 from math import sin, cos
 import argparse
 import math
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 import matplotlib.pyplot as plt
 
 
@@ -48,68 +51,504 @@ def calculate_x_coordinate(x_velocity, time):
     """
     return x_velocity * time 
 
-def motion_no_drag(data):
+def simulate_trajectory(data, drag=None):
     """
-    Create animation for projectile motion with no dragging force
+    Compute one trajectory without any rendering, as fast as the CPU allows.
+    Positions go into preallocated numpy arrays, and the last point is moved onto the ground
+    where the ball lands.
+    param:
+        data: dictionary with the launch settings and constants (see main)
+        drag: None for no drag (exact formulas) or a drag model from drag_acceleration
+    returns:
+        dictionary with numpy arrays "t", "x" and "y"
     """
-    ball_nd = sphere(pos=vector(0, data['init_height'], 0),
-                        radius=data["ball_radius"], color=color.cyan, make_trail=True)
-
-    # Follow the movement of the ball
-    scene.camera.follow(ball_nd)
-
-    # Set initial velocity & position
+    deltat = data['deltat']
+    max_time = data.get('max_time', 100.0)
+    steps = int(max_time / deltat) + 1
     init_x_velocity = cos(math.radians(data['theta'])) * data['init_velocity']
     init_y_velocity = sin(math.radians(data['theta'])) * data['init_velocity']
-    ball_nd.velocity = vector(init_x_velocity, init_y_velocity, 0)
-    data["x_no_drag"] = [] # list to hold x coordinatates for graphing later
-    data["y_no_drag"] = [] # list to hold y coordinatates for graphing later
-
-    # Animate
-    t = 0
-    stopping_point = data["ball_radius"] + 0.12
-    while t < 100:
-        if(ball_nd.pos.y < stopping_point and ball_nd.pos.x > 1):
-            break
-        rate(1000)
-        ball_nd.pos.x = calculate_x_coordinate(init_x_velocity, t)
-        ball_nd.pos.y = calculate_y_coordinate(init_y_velocity, t)
-        data["x_no_drag"].append(ball_nd.pos.x)
-        data["y_no_drag"].append(ball_nd.pos.y)
-        t = t + data['deltat']
+    gravity = data['gravity']
+
+    t = np.arange(steps) * deltat
+    if drag is None:
+        x = calculate_x_coordinate(init_x_velocity, t)
+        y = data['init_height'] + calculate_y_coordinate(init_y_velocity, t, -gravity)
+    else:
+        x = np.empty(steps)
+        y = np.empty(steps)
+        px, py = 0.0, data['init_height']
+        vx, vy = init_x_velocity, init_y_velocity
+        x[0], y[0] = px, py
+        for i in range(1, steps):
+            drag_x, drag_y = drag_acceleration(vx, vy, data['beta'], drag)
+            vx += drag_x * deltat
+            vy += (gravity + drag_y) * deltat
+            px += vx * deltat
+            py += vy * deltat
+            x[i], y[i] = px, py
+            if py <= 0.0:
+                break
+
+    below = np.flatnonzero(y[1:] <= 0.0)
+    if below.size:
+        last = below[0] + 1
+        fraction = y[last - 1] / (y[last - 1] - y[last])
+        t = t[:last + 1].copy()
+        x = x[:last + 1].copy()
+        y = y[:last + 1].copy()
+        t[last] = t[last - 1] + fraction * deltat
+        x[last] = x[last - 1] + fraction * (x[last] - x[last - 1])
+        y[last] = 0.0
+    return {"t": t, "x": x, "y": y}
+
+# Dormand-Prince 5(4) coefficients
+DP_A = [np.array([]),
+        np.array([1/5]),
+        np.array([3/40, 9/40]),
+        np.array([44/45, -56/15, 32/9]),
+        np.array([19372/6561, -25360/2187, 64448/6561, -212/729]),
+        np.array([9017/3168, -355/33, 46732/5247, 49/176, -5103/18656]),
+        np.array([35/384, 0, 500/1113, 125/192, -2187/6784, 11/84])]
+DP_B5 = np.array([35/384, 0, 500/1113, 125/192, -2187/6784, 11/84, 0])
+DP_B4 = np.array([5179/57600, 0, 7571/16695, 393/640, -92097/339200, 187/2100, 1/40])
+# 4th order interpolant inside a step (Shampine's dense output, powers 1 to 4 of the step fraction)
+DP_DENSE = np.array([
+    [1, -8048581381/2820520608, 8663915743/2820520608, -12715105075/11282082432],
+    [0, 0, 0, 0],
+    [0, 131558114200/32700410799, -68118460800/10900136933, 87487479700/32700410799],
+    [0, -1754552775/470086768, 14199869525/1410260304, -10690763975/1880347072],
+    [0, 127303824393/49829197408, -318862633887/49829197408, 701980252875/199316789632],
+    [0, -282668133/205662961, 2019193451/616988883, -1453857185/822651844],
+    [0, 40617522/29380423, -110615467/29380423, 69997945/29380423]])
+
+def dormand_prince_step(rhs, state, h, k1):
+    """
+    One Dormand-Prince step
+    param:
+        rhs: function of the state returning its time derivative
+        state: numpy state vector at the start of the step
+        h: step size
+        k1: rhs(state), passed in because it is the last stage of the previous step
+    returns:
+        new_state: 5th order solution at the end of the step
+        error: estimated error vector of the step
+        k: array of the 7 stages, the last one is rhs(new_state) (the first stage of the next step)
+    """
+    k = np.empty((7, state.size))
+    k[0] = k1
+    for i in range(1, 7):
+        k[i] = rhs(state + h * np.dot(DP_A[i], k[:i]))
+    new_state = state + h * np.dot(DP_B5, k)
+    error = h * np.dot(DP_B5 - DP_B4, k)
+    return new_state, error, k
+
+def dense_state(state, dense, h, s):
+    """
+    4th order interpolant of the state inside an accepted step
+    param:
+        state: state at the start of the step
+        dense: np.dot(k.T, DP_DENSE) for the stages k of the step
+        h: step size
+        s: fraction of the step, 0 to 1
+    returns:
+        interpolated state vector
+    """
+    return state + h * np.dot(dense, [s, s**2, s**3, s**4])
+
+def adaptive_trajectory(data, drag="linear", rtol=1e-6, atol=1e-8):
+    """
+    Compute one trajectory with an error controlled Dormand-Prince integrator.
+    Steps grow where the motion is smooth (e.g. around the apex) and shrink where needed, and the
+    moment the ball reaches y = 0 is found by root finding on the interpolant of the last step.
+    param:
+        data: dictionary with the launch settings and constants (see main)
+        drag: drag model from drag_acceleration
+        rtol, atol: relative and absolute error allowed per step
+    returns:
+        dictionary with numpy arrays "t", "x", "y", "vx", "vy" (accepted steps, the last one on
+        the ground), "h" and "dense" (size and interpolant coefficients of the step starting at
+        each point, used by resample_trajectory), "impact_time", "impact_x" and "nfev" (number of
+        derivative evaluations)
+    """
+    gravity = data['gravity']
+    beta = data.get('beta', 0.0)
+    max_time = data.get('max_time', 100.0)
+    evaluations = [0]
+
+    def rhs(state):
+        evaluations[0] += 1
+        drag_x, drag_y = drag_acceleration(state[2], state[3], beta, drag)
+        return np.array([state[2], state[3], drag_x, gravity + drag_y])
+
+    def result(history, steps, dense, impact_time, impact_x):
+        history = np.array(history)
+        return {"t": history[:, 0], "x": history[:, 1], "y": history[:, 2], "vx": history[:, 3], "vy": history[:, 4],
+                "h": np.array(steps), "dense": np.array(dense).reshape(-1, 4, 4),
+                "impact_time": impact_time, "impact_x": impact_x, "nfev": evaluations[0]}
+
+    theta = math.radians(data['theta'])
+    state = np.array([0.0, data['init_height'], cos(theta) * data['init_velocity'], sin(theta) * data['init_velocity']])
+    k1 = rhs(state)
+    t = 0.0
+    h = min(0.01, max_time)
+    history = [np.concatenate(([t], state))]   # rows of t, x, y, vx, vy
+    steps = []      # size of the step starting at each history row
+    dense = []      # interpolant of the step starting at each history row
+
+    while t < max_time:
+        h = min(h, max_time - t)
+        new_state, error, k = dormand_prince_step(rhs, state, h, k1)
+        scale = atol + rtol * np.maximum(np.abs(state), np.abs(new_state))
+        error_norm = np.sqrt(np.mean((error / scale)**2))
+        if error_norm > 1.0:
+            h *= max(0.2, 0.9 * error_norm**-0.2)
+            continue
+        q = np.dot(k.T, DP_DENSE)
+        steps.append(h)
+        dense.append(q)
+
+        if new_state[1] <= 0.0 and (state[1] > 0.0 or t > 0.0):
+            # Illinois regula falsi on the interpolant of the step, which needs no further
+            # derivative evaluations
+            low, high = 0.0, 1.0
+            y_low, y_high = state[1], new_state[1]
+            side = 0
+            guess = 1.0
+            for _ in range(100):
+                guess = low + (high - low) * y_low / (y_low - y_high)
+                y_guess = dense_state(state, q, h, guess)[1]
+                if abs(y_guess) <= atol or high - low <= 1e-12:
+                    break
+                if y_guess > 0.0:
+                    low, y_low = guess, y_guess
+                    if side == 1:
+                        y_high /= 2     # same end kept twice in a row
+                    side = 1
+                else:
+                    high, y_high = guess, y_guess
+                    if side == -1:
+                        y_low /= 2
+                    side = -1
+            hit_state = dense_state(state, q, h, guess)
+            t += guess * h
+            hit_state[1] = 0.0
+            history.append(np.concatenate(([t], hit_state)))
+            return result(history, steps, dense, t, hit_state[0])
+
+        t += h
+        state, k1 = new_state, k[6]
+        history.append(np.concatenate(([t], state)))
+        h *= min(5.0, 0.9 * max(error_norm, 1e-10)**-0.2)
+
+    return result(history, steps, dense, np.nan, np.nan)
+
+def resample_trajectory(trajectory, deltat):
+    """
+    Fill in an adaptive trajectory at evenly spaced times for plotting and animation, using the
+    4th order interpolant of each accepted step
+    param:
+        trajectory: result of adaptive_trajectory
+        deltat: time between the new points
+    returns:
+        dictionary with numpy arrays "t", "x" and "y"
+    """
+    t = trajectory["t"]
+    new_t = np.append(np.arange(t[0], t[-1], deltat), t[-1])
+    step = np.clip(np.searchsorted(t, new_t, side="right") - 1, 0, t.size - 2)
+    h = trajectory["h"][step]
+    s = (new_t - t[step]) / h
+    powers = np.stack((s, s**2, s**3, s**4), axis=-1)
+    resampled = {"t": new_t}
+    for column, pos in enumerate(("x", "y")):
+        q = trajectory["dense"][step, column]
+        resampled[pos] = trajectory[pos][step] + h * np.sum(q * powers, axis=-1)
+    return resampled
+
+def play_trajectory(trajectory, ball_color, data, fps=100, speed=1.0):
+    """
+    Replay a computed trajectory in the vpython scene
+    param:
+        trajectory: result of simulate_trajectory
+        ball_color: vpython color of the ball
+        data: dictionary with the constants (ball_radius is used)
+        fps: frames drawn per second
+        speed: playback speed, 1 is real time
+    returns:
+        nothing
+    """
+    t, x, y = trajectory["t"], trajectory["x"], trajectory["y"]
+    ball = sphere(pos=vector(x[0], y[0], 0), radius=data["ball_radius"], color=ball_color, make_trail=True)
+    scene.camera.follow(ball)
+    frame_times = np.arange(0.0, t[-1] + speed / fps, speed / fps)
+    frames = np.minimum(np.searchsorted(t, frame_times), t.size - 1)
+    for i in frames:
+        rate(fps)
+        ball.pos = vector(x[i], max(y[i], data["ball_radius"]), 0)   # keeps the ball from going through the floor
+
+def motion_no_drag(data):
+    """
+    Compute (and unless data["headless"] is set, animate) projectile motion with no dragging force
+    """
+    trajectory = simulate_trajectory(data, drag=None)
+    data["x_no_drag"] = trajectory["x"] # x coordinatates for graphing later
+    data["y_no_drag"] = trajectory["y"] # y coordinatates for graphing later
+    if not data.get("headless"):
+        play_trajectory(trajectory, color.cyan, data, data.get("fps", 100))
 
 def motion_drag(data):
     """
-    Create animation for projectile motion with no dragging force
+    Compute (and unless data["headless"] is set, animate) projectile motion with a dragging force
+    """
+    if data.get("adaptive"):
+        trajectory = adaptive_trajectory(data, drag="linear", rtol=data.get("rtol", 1e-6))
+        print("Drag impact at x = {:.4f} m, t = {:.4f} s ({} derivative evaluations)".format(
+            trajectory["impact_x"], trajectory["impact_time"], trajectory["nfev"]))
+        trajectory = resample_trajectory(trajectory, data['deltat'])
+    else:
+        trajectory = simulate_trajectory(data, drag="linear")
+    data["x_with_drag"] = trajectory["x"] # x coordinatates for graphing later
+    data["y_with_drag"] = trajectory["y"] # y coordinatates for graphing later
+    if not data.get("headless"):
+        play_trajectory(trajectory, color.red, data, data.get("fps", 100))
+
+def drag_acceleration(vx, vy, beta, drag):
+    """
+    Acceleration from air resistance
+    param:
+        vx, vy: velocity components (numbers or numpy arrays)
+        beta: drag coefficient divided by the mass (alpha / ball_mass)
+        drag: "linear" (proportional to v, what motion_drag uses), "quadratic" (proportional to |v| v)
+              or None for no drag
+    returns:
+        ax, ay: drag acceleration components
     """
-    ball_nd = sphere(pos=vector(0, data['init_height'], 0),
-                        radius=data["ball_radius"], color=color.red, make_trail=True)
+    if drag is None or drag == "none":
+        return 0.0 * vx, 0.0 * vy
+    if drag == "linear":
+        return -beta * vx, -beta * vy
+    if drag == "quadratic":
+        speed = np.sqrt(vx * vx + vy * vy)
+        return -beta * speed * vx, -beta * speed * vy
+    raise ValueError("drag must be None, 'linear' or 'quadratic', not {!r}".format(drag))
 
-    # Follow the movement of the ball
-    scene.camera.follow(ball_nd)
+def simulate_batch(velocity, angle, height, beta=0.0, drag="linear", gravity=-9.8, deltat=0.005, max_time=100.0):
+    """
+    Integrate many launches at once with numpy arrays (same Euler step as motion_drag).
+    Launches that have hit the ground are dropped from the arrays, and the impact point is
+    interpolated inside the last step.
+    param:
+        velocity: launch speeds in m/s (number or array)
+        angle: launch angles in degrees (number or array)
+        height: launch heights in m (number or array)
+        beta: drag coefficient divided by the mass, per launch or one for all
+        drag: drag model, see drag_acceleration
+        gravity: acceleration of gravity in m/s^2 (negative is down)
+        deltat: time step in seconds
+        max_time: launches still flying after this many seconds are stopped
+    returns:
+        dictionary of arrays, one entry per launch: "range" (x at impact), "apex" (highest y),
+        "flight_time" (time of impact) and "landed" (False if max_time was reached first)
+    """
+    velocity, angle, height, beta = np.broadcast_arrays(*(np.asarray(v, dtype=np.float64) for v in (velocity, angle, height, beta)))
+    shape = velocity.shape
+    theta = np.radians(angle.ravel())
+    vx = velocity.ravel() * np.cos(theta)
+    vy = velocity.ravel() * np.sin(theta)
+    x = np.zeros(vx.size)
+    y = height.ravel().copy()
+    beta = beta.ravel().copy()
 
-    # Set initial velocity & position
-    init_x_velocity = cos(math.radians(data['theta'])) * data['init_velocity']
-    init_y_velocity = sin(math.radians(data['theta'])) * data['init_velocity']
-    ball_nd.velocity = vector(init_x_velocity, init_y_velocity, 0)
-    data["x_with_drag"] = [] # list to hold x coordinatates for graphing later
-    data["y_with_drag"] = [] # list to hold y coordinatates for graphing later
-
-    # Animate
-    g = vector(0, data["gravity"], 0) 
-    t = 0
-    stopping_point = data["ball_radius"] + 0.12 # keeps the ball from going through the floor
-    while t < 100:
-        if(ball_nd.pos.y < stopping_point and ball_nd.pos.x > 1):
-            break
-        rate(1000)
-        net_force = data["ball_mass"] * g - (ball_nd.velocity * data["alpha"])
-        ball_nd.velocity = ball_nd.velocity + (net_force/data["ball_mass"] * data['deltat'])
-        ball_nd.pos = ball_nd.pos + ball_nd.velocity * data['deltat']
-        data["x_with_drag"].append(ball_nd.pos.x)
-        data["y_with_drag"].append(ball_nd.pos.y)
-
-        t = t + data['deltat']
+    flight_range = np.full(vx.size, np.nan)
+    apex = y.copy()
+    flight_time = np.full(vx.size, max_time)
+    landed = np.zeros(vx.size, dtype=bool)
+    active = np.arange(vx.size)     # launches still in the air
+
+    t = 0.0
+    while active.size and t < max_time:
+        drag_x, drag_y = drag_acceleration(vx, vy, beta, drag)
+        vx = vx + drag_x * deltat
+        vy = vy + (gravity + drag_y) * deltat
+        new_x = x + vx * deltat
+        new_y = y + vy * deltat
+        apex[active] = np.maximum(apex[active], new_y)
+
+        down = new_y <= 0.0
+        if down.any():
+            # fraction of the step where y crossed 0
+            fraction = y[down] / (y[down] - new_y[down])
+            hit = active[down]
+            flight_range[hit] = x[down] + fraction * (new_x[down] - x[down])
+            flight_time[hit] = t + fraction * deltat
+            landed[hit] = True
+            flying = ~down
+            active, vx, vy, beta = active[flying], vx[flying], vy[flying], beta[flying]
+            new_x, new_y = new_x[flying], new_y[flying]
+        x, y = new_x, new_y
+        t += deltat
+
+    flight_range[active] = x     # still flying at max_time: report where it got to
+    return {"range": flight_range.reshape(shape), "apex": apex.reshape(shape),
+            "flight_time": flight_time.reshape(shape), "landed": landed.reshape(shape)}
+
+def drag_beta(rho, Cd, ball_mass, ball_radius):
+    """
+    Drag constant divided by the mass, the same way main computes alpha and beta
+    param:
+        rho: air density in kg/m^3
+        Cd: drag coefficient
+        ball_mass: mass in kg
+        ball_radius: radius in m
+    returns:
+        beta (numbers or numpy arrays, following the inputs)
+    """
+    alpha = rho * Cd * (math.pi * np.square(ball_radius)) / 2.0
+    return alpha / ball_mass
+
+def _batch_range(velocity, angle, height, beta, drag, deltat):
+    """
+    Ranges of a chunk of launches. Runs in the worker processes.
+    """
+    return simulate_batch(velocity, angle, height, beta, drag, deltat=deltat)["range"]
+
+def parallel_ranges(velocity, angle, height, beta, drag="linear", deltat=0.005, workers=None):
+    """
+    Ranges of many launches, split into chunks that are simulated in worker processes
+    param:
+        velocity, angle, height: 1-d arrays of launch settings, all the same length
+        beta: drag constant over mass (number)
+        drag: drag model, see drag_acceleration
+        deltat: time step in seconds
+        workers: number of worker processes, 1 to run in this process, None for the number of CPUs
+    returns:
+        numpy array of ranges
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(velocity) < 1000:
+        return _batch_range(velocity, angle, height, beta, drag, deltat)
+    chunks = np.array_split(np.arange(len(velocity)), workers)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(_batch_range, [velocity[c] for c in chunks], [angle[c] for c in chunks],
+                           [height[c] for c in chunks], [beta] * workers, [drag] * workers, [deltat] * workers)
+        return np.concatenate(list(results))
+
+def optimize_launch(velocity, height=1.2, ball_mass=0.145, Cd=0.5, rho=1.225, ball_radius=0.075,
+                    drag="linear", angles=None, deltat=0.005, tol=1e-3, workers=None):
+    """
+    Find the launch angle with the longest range for every velocity/height combination.
+    A grid of angles is simulated in parallel first, then a golden section search between the
+    neighbours of the best grid angle narrows it down (all combinations at once).
+    param:
+        velocity: launch speed(s) in m/s
+        height: launch height(s) in m
+        ball_mass, Cd, rho, ball_radius: ball and air properties for the drag
+        drag: drag model, see drag_acceleration
+        angles: grid of angles in degrees, default every degree from 0 to 90
+        deltat: time step in seconds
+        tol: stop the search when the bracket is smaller than this many degrees
+        workers: number of worker processes for the grid
+    returns:
+        dictionary with "angles" (the grid), "range_curve" (range for every velocity, height and
+        grid angle), "best_angle" and "best_range" (one per velocity and height)
+    """
+    angles = np.linspace(0.0, 90.0, 91) if angles is None else np.asarray(angles, dtype=np.float64)
+    velocities = np.atleast_1d(np.asarray(velocity, dtype=np.float64))
+    heights = np.atleast_1d(np.asarray(height, dtype=np.float64))
+    beta = drag_beta(rho, Cd, ball_mass, ball_radius)
+
+    grid_v, grid_h, grid_a = np.meshgrid(velocities, heights, angles, indexing="ij")
+    curve = parallel_ranges(grid_v.ravel(), grid_a.ravel(), grid_h.ravel(), beta, drag, deltat, workers).reshape(grid_v.shape)
+
+    best = np.argmax(curve, axis=-1)
+    low = angles[np.maximum(best - 1, 0)]
+    high = angles[np.minimum(best + 1, angles.size - 1)]
+    v, h = grid_v[..., 0], grid_h[..., 0]
+
+    def ranges(angle):
+        return simulate_batch(v, angle, h, beta, drag, deltat=deltat)["range"]
+
+    golden = (math.sqrt(5) - 1) / 2
+    a = high - golden * (high - low)
+    b = low + golden * (high - low)
+    range_a, range_b = ranges(a), ranges(b)
+    while np.max(high - low) > tol:
+        keep_low = range_a >= range_b     # the maximum is in [low, b]
+        high = np.where(keep_low, b, high)
+        low = np.where(keep_low, low, a)
+        new_a = np.where(keep_low, high - golden * (high - low), b)
+        new_b = np.where(keep_low, a, low + golden * (high - low))
+        new_range = ranges(np.where(keep_low, new_a, new_b))
+        range_a, range_b = np.where(keep_low, new_range, range_b), np.where(keep_low, range_a, new_range)
+        a, b = new_a, new_b
+
+    best_angle = (low + high) / 2
+    result = {"angles": angles, "range_curve": curve, "best_angle": best_angle, "best_range": ranges(best_angle)}
+    if np.ndim(velocity) == 0 and np.ndim(height) == 0:
+        result["range_curve"] = curve[0, 0]
+        result["best_angle"] = float(best_angle[0, 0])
+        result["best_range"] = float(result["best_range"][0, 0])
+    return result
+
+def plot_range_curve(result):
+    """
+    Plot range against launch angle for an optimize_launch result with one velocity and height
+    param:
+        result: dictionary from optimize_launch
+    returns:
+        nothing
+    """
+    plt.title("Range vs Launch Angle")
+    plt.xlabel("Angle in Degrees")
+    plt.ylabel("Range in Meters")
+    plt.plot(result["angles"], result["range_curve"], label="Range")
+    plt.axvline(result["best_angle"], color="red", linestyle="--",
+                label="Best angle {:.2f} degrees".format(result["best_angle"]))
+    plt.legend()
+    plt.show()
+
+def monte_carlo_ranges(velocity, angle, height=1.2, samples=100000, rho=(1.225, 0.05), Cd=(0.5, 0.05),
+                       ball_mass=(0.145, 0.002), ball_radius=(0.075, 0.001), drag="linear",
+                       percentiles=(5, 25, 50, 75, 95), chunk_size=20000, deltat=0.005, seed=None):
+    """
+    Landing distance spread when the drag parameters are uncertain.
+    Each parameter is drawn from a normal distribution given as (mean, standard deviation) and
+    the launches are simulated as vectorized batches of chunk_size to keep memory bounded.
+    Launches that are still in the air after simulate_batch's max_time are left out of the stats.
+    param:
+        velocity: launch speed in m/s
+        angle: launch angle in degrees
+        height: launch height in m
+        samples: number of launches to simulate
+        rho, Cd, ball_mass, ball_radius: (mean, standard deviation) of each parameter
+        drag: "linear" (the model the other modes use) or "quadratic", see drag_acceleration
+        percentiles: which percentiles of the landing distance to report
+        chunk_size: number of launches simulated at once
+        deltat: time step in seconds
+        seed: random seed, for repeatable results
+    returns:
+        dictionary with "ranges" (landing distance of every launch that landed), "not_landed"
+        (number of launches left out), "mean", "std" and "percentiles" (dictionary of landing
+        distance keyed by percentile)
+    """
+    generator = np.random.default_rng(seed)
+    ranges = np.empty(samples)
+    landed = np.empty(samples, dtype=bool)
+    for start in range(0, samples, chunk_size):
+        count = min(chunk_size, samples - start)
+        # negative or zero draws make no physical sense, keep every parameter a little above 0
+        draws = [np.maximum(generator.normal(mean, std, count), 1e-6 * mean)
+                 for mean, std in (rho, Cd, ball_mass, ball_radius)]
+        beta = drag_beta(*draws)
+        result = simulate_batch(velocity, angle, height, beta, drag, deltat=deltat)
+        ranges[start:start + count] = result["range"]
+        landed[start:start + count] = result["landed"]
+    ranges = ranges[landed]
+    if ranges.size == 0:
+        return {"ranges": ranges, "not_landed": samples, "mean": np.nan, "std": np.nan,
+                "percentiles": dict.fromkeys(percentiles, np.nan)}
+    return {"ranges": ranges, "not_landed": int(samples - ranges.size),
+            "mean": float(np.mean(ranges)), "std": float(np.std(ranges)),
+            "percentiles": dict(zip(percentiles, np.percentile(ranges, percentiles).tolist()))}
 
 def plot_data(data):
     """
@@ -135,16 +574,30 @@ def main():
     parser = argparse.ArgumentParser(description="Projectile Motion")
 
     parser.add_argument("--velocity", "-v", action="store", dest="velocity", type=float, required=True, help="velocity in m/s --velocity 20")
-    parser.add_argument("--angle", "-a", action="store", dest="angle", type=float, required=True, help="angle in degrees --angle 45")
+    parser.add_argument("--angle", "-a", action="store", dest="angle", type=float, required=False, default=None, help="angle in degrees --angle 45")
     parser.add_argument("--height", action="store", dest="height", type=float, required=False, default=1.2, help="height in meters --height 1.2")
+    parser.add_argument("--headless", action="store_true", dest="headless", help="skip the vpython animation, only compute and plot")
+    parser.add_argument("--adaptive", action="store_true", dest="adaptive", help="use the error controlled integrator for the drag motion")
+    parser.add_argument("--rtol", action="store", dest="rtol", type=float, required=False, default=1e-6, help="relative error per step for --adaptive --rtol 1e-6")
+    parser.add_argument("--optimize", action="store_true", dest="optimize", help="find the launch angle with the longest range with drag instead of animating")
+    parser.add_argument("--monte-carlo", action="store", dest="monte_carlo", type=int, required=False, default=None, help="number of launches with uncertain drag parameters --monte-carlo 100000")
+    parser.add_argument("--drag-model", action="store", dest="drag_model", choices=["linear", "quadratic"], default="linear", help="drag model for --optimize and --monte-carlo")
+    parser.add_argument("--workers", action="store", dest="workers", type=int, required=False, default=None, help="worker processes for --optimize")
+    parser.add_argument("--fps", action="store", dest="fps", type=float, required=False, default=100, help="animation frames per second --fps 100")
 
     args = parser.parse_args()
+    if args.angle is None and not args.optimize:
+        parser.error("the following arguments are required: --angle/-a")
     # Set Variables
     data = {}       # empty dictionary for all data and variables
     data['theta'] = 45 
     data['init_height'] = args.height   # y-axis
     data['init_velocity'] = args.velocity  # m/s
     data['theta'] = args.angle       # degrees
+    data['headless'] = args.headless
+    data['fps'] = args.fps
+    data['adaptive'] = args.adaptive
+    data['rtol'] = args.rtol
     # Constants
     data['rho'] = 1.225  # kg/m^3 air density
     data['Cd'] = 0.5    # coefficient friction
@@ -156,8 +609,25 @@ def main():
     data['ball_area'] = pi * data['ball_radius']**2
     data['alpha'] = data['rho'] * data['Cd'] * data['ball_area'] / 2.0
     data['beta'] = data['alpha'] / data['ball_mass']
+    if args.optimize:
+        result = optimize_launch(data['init_velocity'], data['init_height'], data['ball_mass'], data['Cd'],
+                                 data['rho'], data['ball_radius'], drag=args.drag_model, deltat=data['deltat'],
+                                 workers=args.workers)
+        print("Best angle: {:.3f} degrees, range {:.3f} m".format(result["best_angle"], result["best_range"]))
+        plot_range_curve(result)
+        return
+    if args.monte_carlo:
+        result = monte_carlo_ranges(data['init_velocity'], data['theta'], data['init_height'], args.monte_carlo,
+                                    drag=args.drag_model, deltat=data['deltat'])
+        print("Landing distance: mean {:.3f} m, std {:.3f} m".format(result["mean"], result["std"]))
+        if result["not_landed"]:
+            print("  {} launches had not landed by the end of the simulation and are left out".format(result["not_landed"]))
+        for percentile, distance in result["percentiles"].items():
+            print("  {:>3}th percentile: {:.3f} m".format(percentile, distance))
+        return
     # Set Scene
-    set_scene(data)
+    if not data['headless']:
+        set_scene(data)
     # 2) No Drag Animation
     motion_no_drag(data)
     # 3) Drag Animation
@@ -0,0 +1,184 @@
+"""
+Checkpoint and resume for long running fixed step ODE simulations.
+
+The integrator state is saved every so many steps to a small .npz file, and the recorded history
+is streamed to a raw binary file next to it instead of being kept in memory. A run that is stopped
+(or crashes) picks up from its last checkpoint and produces exactly the same results as a run that
+was never interrupted.
+"""
+import os
+import numpy as np
+from ode_solver import STEPPERS
+
+
+def save_checkpoint(path, **arrays):
+    """
+    Save arrays to an .npz checkpoint. The file is written under a temporary name first, so an
+    interrupted save never destroys the previous checkpoint.
+    :param path: checkpoint file name
+    :param arrays: names and values to store
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, mode='wb') as file:
+        np.savez(file, **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path):
+    """
+    :param path: checkpoint file name
+    :return: dictionary of the stored arrays, or None if there is no checkpoint
+    """
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+class DiskHistory:
+    """
+    History recorder that appends its rows (time followed by the values) to a binary file of
+    float64s. Rows are collected in a small preallocated buffer and written a block at a time,
+    so memory use does not grow with the length of the run.
+    """
+
+    def __init__(self, path, width, rows=0, buffer_rows=4096):
+        """
+        :param path: file to write the rows to
+        :param width: number of values per row (not counting the time)
+        :param rows: number of rows already in the file to keep (when resuming); anything after
+                     them was written after the last checkpoint and is thrown away
+        :param buffer_rows: rows collected in memory before they are written out
+        """
+        self.path = path
+        self.width = width
+        self.buffer = np.empty((buffer_rows, width + 1))
+        self.buffered = 0
+        self.written = rows
+        with open(path, mode='ab') as file:
+            file.truncate(rows*(width + 1)*8)
+
+    def __len__(self):
+        return self.written + self.buffered
+
+    def append(self, t, values):
+        """
+        Record one row
+        :param t: time
+        :param values: the width values of the row
+        """
+        self.buffer[self.buffered, 0] = t
+        self.buffer[self.buffered, 1:] = values
+        self.buffered += 1
+        if self.buffered == self.buffer.shape[0]:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered rows to the file
+        """
+        if self.buffered:
+            with open(self.path, mode='ab') as file:
+                self.buffer[:self.buffered].tofile(file)
+            self.written += self.buffered
+            self.buffered = 0
+
+    def arrays(self):
+        """
+        :return: times: memory mapped array of the recorded times
+                 values: memory mapped array with one row of values per recorded time
+        """
+        self.flush()
+        if self.written == 0:
+            return np.empty(0), np.empty((0, self.width))
+        rows = np.memmap(self.path, dtype=np.float64, mode='r', shape=(self.written, self.width + 1))
+        return rows[:, 0], rows[:, 1:]
+
+
+def run_with_checkpoints(f, y0, t_end, h, path, method="rk4", checkpoint_every=10000,
+                         record_every=1, record=None, on_step=None, save_state=None, load_state=None,
+                         settings=None):
+    """
+    Integrate with a fixed step, writing a checkpoint every checkpoint_every steps and streaming
+    the history to path + ".history". If a checkpoint already exists at path the run resumes from it.
+    :param f: right hand side f(y, t)
+    :param y0: initial state; when resuming it must match the one the checkpoint was started from
+    :param t_end: time to integrate to
+    :param h: step size
+    :param path: checkpoint file name
+    :param method: "euler", "rk2" or "rk4"
+    :param checkpoint_every: steps between checkpoints
+    :param record_every: record every this many steps
+    :param record: function of the state giving the values to record, default the whole state
+    :param on_step: optional function on_step(t, y) called with the starting state and after every step
+                    (the starting state is skipped when load_state restored a saved state, it was seen before)
+    :param save_state: optional function returning a dictionary of arrays saved with every checkpoint,
+                       e.g. the running results that on_step builds up
+    :param load_state: optional function given that dictionary back when resuming (if the
+                       checkpoint has one)
+    :param settings: optional dictionary of other parameters of the run (e.g. the constants used
+                     by f); they are saved with the checkpoint and must match when resuming
+    :return: t: final time
+             y: final state
+             history: DiskHistory with the recorded times and values
+    """
+    step = STEPPERS[method]
+    if record is None:
+        record = np.ravel
+    y0 = np.array(y0, dtype=np.float64)
+    settings = {name: np.asarray(value) for name, value in (settings or {}).items()}
+    total_steps = int(round(t_end/h))
+    saved = load_checkpoint(path)
+    if saved is not None:
+        for name, value in {"h": h, "method": method, "record_every": record_every}.items():
+            if name not in saved or saved[name] != value:
+                raise ValueError("checkpoint {} was written with {}={}, not {}; delete it to start over"
+                                 .format(path, name, saved[name] if name in saved else "unknown", value))
+        saved_settings = {name[8:]: value for name, value in saved.items() if name.startswith("setting_")}
+        changed = sorted(name for name in set(saved_settings) | set(settings)
+                         if name not in saved_settings or name not in settings
+                         or not np.array_equal(saved_settings[name], settings[name]))
+        if changed:
+            raise ValueError("checkpoint {} was written with different {}; delete it to start over"
+                             .format(path, ", ".join(changed)))
+        if "y0" not in saved or saved["y0"].shape != y0.shape or not np.array_equal(saved["y0"], y0):
+            raise ValueError("checkpoint {} was started from a different initial state; delete it to start over"
+                             .format(path))
+        y = saved["y"]
+        steps = int(saved["steps"])
+        t0 = float(saved["t0"])
+        history = DiskHistory(path + ".history", int(saved["width"]), rows=int(saved["rows"]))
+        extra = {name[6:]: value for name, value in saved.items() if name.startswith("state_")}
+        restored = bool(load_state and extra)
+        if restored:
+            load_state(extra)
+    else:
+        y = y0.copy()
+        restored = False
+        steps = 0
+        t0 = 0.0
+        history = DiskHistory(path + ".history", np.size(record(y)))
+        history.append(t0, record(y))
+    if on_step and not restored:
+        on_step(t0 + steps*h, y)
+
+    def checkpoint():
+        history.flush()
+        extra = {}
+        if save_state:
+            extra = {"state_" + name: value for name, value in save_state().items()}
+        extra.update({"setting_" + name: value for name, value in settings.items()})
+        save_checkpoint(path, y=y, steps=steps, t0=t0, width=history.width, rows=len(history),
+                        h=h, method=method, record_every=record_every, y0=y0, **extra)
+
+    while steps < total_steps:
+        y = step(f, y, t0 + steps*h, h)
+        steps += 1
+        if on_step:
+            on_step(t0 + steps*h, y)
+        if steps % record_every == 0:
+            history.append(t0 + steps*h, record(y))
+        if steps % checkpoint_every == 0:
+            checkpoint()
+    checkpoint()
+    return t0 + steps*h, y, history
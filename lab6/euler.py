@@ -1,4 +1,5 @@
 import numpy as np
+from ode_solver import solve
 
 
 def f_x(x, t):
@@ -18,14 +19,10 @@ def main():
     x = 0.0         # Initial condition
 
     tpoints = np.arange(a, b, h)
-    xpoints = []
-    # loop over time interval
-    for t in tpoints:
-        xpoints.append(x)
-        x += h*f_x(x, t)
+    xpoints = solve(f_x, x, tpoints, method="euler")
 
     # Print Values
-    print(xpoints)
+    print(xpoints.tolist())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,117 @@
+"""
+Recorder for simulation history (time plus one or more values per sample) backed by
+preallocated numpy arrays instead of growing python lists.
+"""
+import numpy as np
+
+
+class History:
+    """
+    Keeps the recorded samples in preallocated arrays.
+    With ring=True the recorder has a fixed capacity and overwrites the oldest rows once it is
+    full, otherwise it doubles its arrays when it runs out of room.
+    Samples can be thinned out as they come in:
+        mode="sample" keeps every decimate-th sample
+        mode="minmax" keeps the min and the max of every block of decimate samples, so peaks
+                      still show up in plots of long runs. The min row is given the time of the
+                      block's first sample and the max row the time of its last one, not the
+                      times they actually happened (each column can peak at a different time),
+                      so recorded times are only good to within one block.
+    """
+
+    def __init__(self, width, capacity=1024, decimate=1, ring=False, mode="sample"):
+        """
+        :param width: number of values per sample
+        :param capacity: number of rows to preallocate (even for a minmax ring)
+        :param decimate: number of samples combined into each recorded one (or min/max pair)
+        :param ring: True for a fixed size ring buffer that keeps the newest rows
+        :param mode: "sample" or "minmax"
+        """
+        if mode not in ("sample", "minmax"):
+            raise ValueError("mode must be 'sample' or 'minmax', not {!r}".format(mode))
+        if mode == "minmax" and capacity < 2:
+            raise ValueError("minmax mode needs a capacity of at least 2")
+        if mode == "minmax" and ring and capacity % 2:
+            # rows are stored in min/max pairs, an odd ring would evict half of a pair
+            raise ValueError("minmax mode with ring=True needs an even capacity, not {}".format(capacity))
+        self.width = width
+        self.decimate = max(1, int(decimate))
+        self.ring = ring
+        self.mode = mode
+        self.times = np.empty(capacity)
+        self.values = np.empty((capacity, width))
+        self.clear()
+
+    def clear(self):
+        """
+        Forget everything recorded so far (the arrays are kept)
+        """
+        self.start = 0      # row of the oldest sample
+        self.count = 0      # number of rows in use
+        self.seen = 0       # number of samples passed to append
+        self.block_times = [0.0, 0.0]
+        self.block_min = np.full(self.width, np.inf)
+        self.block_max = np.full(self.width, -np.inf)
+
+    def __len__(self):
+        return self.count
+
+    def _store(self, t, values):
+        capacity = self.times.size
+        if self.count == capacity:
+            if self.ring:
+                self.start = (self.start + 1) % capacity
+                self.count -= 1
+            else:
+                self.times = np.resize(self.times, 2*capacity)
+                self.values = np.resize(self.values, (2*capacity, self.width))
+                capacity *= 2
+        row = (self.start + self.count) % capacity
+        self.times[row] = t
+        self.values[row] = values
+        self.count += 1
+
+    def append(self, t, values):
+        """
+        Record one sample
+        :param t: time of the sample
+        :param values: the width values of the sample
+        """
+        position = self.seen % self.decimate
+        self.seen += 1
+        if self.mode == "sample":
+            if position == 0:
+                self._store(t, values)
+            return
+        if position == 0:
+            self.block_times[0] = t
+            self.block_min[:] = values
+            self.block_max[:] = values
+        else:
+            np.minimum(self.block_min, values, out=self.block_min)
+            np.maximum(self.block_max, values, out=self.block_max)
+        self.block_times[1] = t
+        if position == self.decimate - 1:
+            self._flush_block()
+
+    def _flush_block(self):
+        self._store(self.block_times[0], self.block_min)
+        self._store(self.block_times[1], self.block_max)
+
+    def arrays(self):
+        """
+        :return: times: array of the recorded times, oldest first
+                 values: array with one row of values per recorded time
+        """
+        if self.mode == "minmax" and self.seen % self.decimate:
+            # include the unfinished block without closing it
+            times = np.append(self._ordered(self.times), self.block_times)
+            values = np.concatenate((self._ordered(self.values), [self.block_min, self.block_max]))
+            return times, values
+        return self._ordered(self.times), self._ordered(self.values)
+
+    def _ordered(self, array):
+        end = self.start + self.count
+        if end <= array.shape[0]:
+            return array[self.start:end]
+        return np.concatenate((array[self.start:], array[:end - array.shape[0]]))
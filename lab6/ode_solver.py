@@ -0,0 +1,154 @@
+"""
+Fixed step ODE solvers shared by the lab 6 programs.
+
+The right hand side is a function f(y, t) that returns dy/dt. y can be a single number, a state
+vector like [theta, omega], or a batch of states (one per row), as long as f works on numpy arrays.
+"""
+import numpy as np
+
+
+def euler_step(f, y, t, h):
+    """
+    One step of Euler's method
+    :param f: right hand side f(y, t)
+    :param y: state at time t
+    :param t: time
+    :param h: step size
+    :return: state at time t + h
+    """
+    return y + h*f(y, t)
+
+
+def rk2_step(f, y, t, h):
+    """
+    One step of the 2nd order Runge-Kutta (midpoint) method
+    """
+    k1 = h*f(y, t)
+    k2 = h*f(y + 0.5*k1, t + 0.5*h)
+    return y + k2
+
+
+def rk4_step(f, y, t, h):
+    """
+    One step of the 4th order Runge-Kutta method
+    """
+    k1 = h*f(y, t)
+    k2 = h*f(y + 0.5*k1, t + 0.5*h)
+    k3 = h*f(y + 0.5*k2, t + 0.5*h)
+    k4 = h*f(y + k3, t + h)
+    return y + (k1 + 2*k2 + 2*k3 + k4)/6
+
+
+STEPPERS = {"euler": euler_step, "rk2": rk2_step, "rk4": rk4_step}
+
+
+def solve(f, y0, tpoints, method="rk4", out=None):
+    """
+    Integrate from tpoints[0] through every time in tpoints
+    :param f: right hand side f(y, t)
+    :param y0: initial state, or a batch of initial states
+    :param tpoints: increasing array of times, the first one is the initial time
+    :param method: "euler", "rk2" or "rk4"
+    :param out: optional preallocated array of shape (len(tpoints),) + shape of y0
+    :return: array with the state at every time in tpoints (out if it was given)
+    """
+    step = STEPPERS[method]
+    tpoints = np.asarray(tpoints, dtype=np.float64)
+    y = np.array(y0, dtype=np.float64)
+    if out is None:
+        out = np.empty((tpoints.size,) + y.shape)
+    out[0] = y
+    for i in range(tpoints.size - 1):
+        y = step(f, y, tpoints[i], tpoints[i + 1] - tpoints[i])
+        out[i + 1] = y
+    return out
+
+
+# Dormand-Prince 5(4) coefficients
+DP_C = np.array([0, 1/5, 3/10, 4/5, 8/9, 1])
+DP_A = [np.array([]),
+        np.array([1/5]),
+        np.array([3/40, 9/40]),
+        np.array([44/45, -56/15, 32/9]),
+        np.array([19372/6561, -25360/2187, 64448/6561, -212/729]),
+        np.array([9017/3168, -355/33, 46732/5247, 49/176, -5103/18656])]
+DP_B = np.array([35/384, 0, 500/1113, 125/192, -2187/6784, 11/84, 0])
+DP_E = DP_B - np.array([5179/57600, 0, 7571/16695, 393/640, -92097/339200, 187/2100, 1/40])
+# coefficients of the 4th order interpolant inside a step (powers 1 to 4 of the step fraction)
+DP_DENSE = np.array([
+    [1, -8048581381/2820520608, 8663915743/2820520608, -12715105075/11282082432],
+    [0, 0, 0, 0],
+    [0, 131558114200/32700410799, -68118460800/10900136933, 87487479700/32700410799],
+    [0, -1754552775/470086768, 14199869525/1410260304, -10690763975/1880347072],
+    [0, 127303824393/49829197408, -318862633887/49829197408, 701980252875/199316789632],
+    [0, -282668133/205662961, 2019193451/616988883, -1453857185/822651844],
+    [0, 40617522/29380423, -110615467/29380423, 69997945/29380423]])
+
+
+def solve_adaptive(f, y0, t_span, t_eval, rtol=1e-6, atol=1e-9):
+    """
+    Integrate with the embedded Dormand-Prince 5(4) method. The step size is picked so the
+    estimated error of every step stays within the tolerance, and the values at t_eval come from
+    the 4th order interpolant of each step, so asking for more output times costs no extra
+    evaluations of f.
+    :param f: right hand side f(y, t)
+    :param y0: initial state (number, vector or batch of states)
+    :param t_span: (start, end) times
+    :param t_eval: increasing times inside t_span to return the solution at
+    :param rtol: relative error allowed per step
+    :param atol: absolute error allowed per step
+    :return: ypoints: array with the state at every time in t_eval
+             nfev: number of evaluations of f
+    """
+    t, t_end = float(t_span[0]), float(t_span[1])
+    y0 = np.array(y0, dtype=np.float64)
+    shape = y0.shape
+    y = y0.ravel()
+    t_eval = np.asarray(t_eval, dtype=np.float64)
+    ypoints = np.empty((t_eval.size,) + shape)
+    nfev = [0]
+
+    def rhs(state, time):
+        nfev[0] += 1
+        return np.asarray(f(state.reshape(shape), time), dtype=np.float64).ravel()
+
+    def error_norm(error, y_new):
+        scale = atol + rtol*np.maximum(np.abs(y), np.abs(y_new))
+        return np.sqrt(np.mean((error/scale)**2))
+
+    k = np.empty((7, y.size))
+    k[0] = rhs(y, t)
+    # first step from the size of the solution and its derivative
+    d0 = np.sqrt(np.mean((y/(atol + rtol*np.abs(y)))**2))
+    d1 = np.sqrt(np.mean((k[0]/(atol + rtol*np.abs(y)))**2))
+    h = 0.01*d0/d1 if d0 > 1e-5 and d1 > 1e-5 else 1e-6
+    h = min(h, t_end - t)
+
+    next_output = 0
+    while next_output < t_eval.size and t_eval[next_output] <= t:
+        ypoints[next_output] = y.reshape(shape)     # output times at the start
+        next_output += 1
+
+    while t < t_end and next_output < t_eval.size:
+        h = min(h, t_end - t)
+        for i in range(1, 6):
+            k[i] = rhs(y + h*np.dot(DP_A[i], k[:i]), t + DP_C[i]*h)
+        y_new = y + h*np.dot(DP_B[:6], k[:6])
+        k[6] = rhs(y_new, t + h)
+        err = error_norm(h*np.dot(DP_E, k), y_new)
+        if err > 1.0:
+            h *= max(0.2, 0.9*err**-0.2)
+            continue
+
+        # fill in the requested times inside this step
+        t_new = t + h
+        q = np.dot(k.T, DP_DENSE)
+        while next_output < t_eval.size and t_eval[next_output] <= t_new:
+            x = (t_eval[next_output] - t)/h
+            ypoints[next_output] = (y + h*np.dot(q, [x, x**2, x**3, x**4])).reshape(shape)
+            next_output += 1
+
+        t, y = t_new, y_new
+        k[0] = k[6]     # the last stage is the first stage of the next step
+        h *= min(5.0, 0.9*max(err, 1e-10)**-0.2)
+    return ypoints, nfev[0]
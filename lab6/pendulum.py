@@ -1,6 +1,10 @@
+import time
 import numpy as np
 from matplotlib import pyplot as plt
 from vpython import *
+from ode_solver import rk4_step
+from history import History
+from checkpoint import run_with_checkpoints
 
 g = 9.81    # m/s**2
 l = 0.1     # meters
@@ -9,33 +13,211 @@ R = 0.01    # ball radius
 c = 0.5     # friction
 framerate = 100
 steps_per_frame = 2
-theta_middle = []  # values of angle for graphing later
-theta_right = []   # values of angle for graphing later
-theta_left = []    # values of angle for graphing later
-time_values = []
 h = 1.0/(framerate * steps_per_frame)
 offset = 2*l + 4*R # offset for the left and the right pendulums
 
-def f_theta_omega(r):
+def make_pendulum_rhs(lengths=l, damping=c):
     """
-    Pendulum
+    Right hand side for a batch of pendulums stored as an (N, 2) array of [theta, omega] rows
+    :param lengths: arm length of each pendulum (or one for all) in meters
+    :param damping: friction of each pendulum (or one for all)
+    :return: function f(r, t) giving [dtheta/dt, domega/dt] for every row
     """
-    theta = r[0]
-    omega = r[1]
-    ftheta = omega
-    fomega = -(g/l)*np.sin(theta) - c*omega
-    return np.array([ftheta, fomega], float)
+    g_over_l = g/np.asarray(lengths, dtype=float)
+    damping = np.asarray(damping, dtype=float)
 
-def rung_kutta(angles):
+    def f(r, t=0.0):
+        theta = r[..., 0]
+        omega = r[..., 1]
+        return np.stack((omega, -g_over_l*np.sin(theta) - damping*omega), axis=-1)
+    return f
+
+# Pendulum with the module's arm length and friction. r is [theta, omega] or an array of them (one pendulum per row).
+f_theta_omega = make_pendulum_rhs()
+
+def pendulum_states(initial_angles, initial_omegas=0.0):
+    """
+    Build the (N, 2) state array for a batch of pendulums
+    :param initial_angles: starting angle of each pendulum in radians
+    :param initial_omegas: starting angular velocity of each pendulum (or one for all)
+    :return: numpy array with one [theta, omega] row per pendulum
+    """
+    angles = np.atleast_1d(np.asarray(initial_angles, dtype=float))
+    state = np.empty((angles.size, 2))
+    state[:, 0] = angles
+    state[:, 1] = initial_omegas
+    return state
+
+def simulate_pendulums(initial_angles, lengths=l, damping=c, t_end=15.0, step=h, record_every=1,
+                       checkpoint=None, checkpoint_every=10000, analyzer=None):
+    """
+    Integrate many pendulums at once without any graphics, one vectorized RK4 step for all of them
+    :param initial_angles: starting angle of each pendulum in radians
+    :param lengths: arm length of each pendulum (or one for all) in meters
+    :param damping: friction of each pendulum (or one for all)
+    :param t_end: time to stop at in seconds
+    :param step: time step in seconds
+    :param record_every: keep the angles of every this many steps
+    :param checkpoint: if given, save the run to this checkpoint file every checkpoint_every steps
+                       (and resume from it if it exists); the angles are then streamed to disk
+                       and returned as memory mapped arrays; a checkpoint of a run with other
+                       pendulums, lengths, damping or step is refused with ValueError
+    :param checkpoint_every: steps between checkpoints
+    :param analyzer: PhaseAnalyzer that is fed the state after every step (its results are saved
+                     with the checkpoints, so a resumed run gives the same results)
+    :return: times: array of the recorded times
+             thetas: array of the recorded angles, one row per recorded time and one column per pendulum
+             state: final (N, 2) state
+    """
+    state = pendulum_states(initial_angles)
+    f = make_pendulum_rhs(lengths, damping)
+    on_step = analyzer.update if analyzer is not None else None
+    if checkpoint:
+        save_state = analyzer.state_arrays if analyzer is not None else None
+        load_state = analyzer.load_state_arrays if analyzer is not None else None
+        settings = {"lengths": np.broadcast_to(lengths, state.shape[:1]), "damping": np.broadcast_to(damping, state.shape[:1])}
+        t, state, history = run_with_checkpoints(f, state, t_end, step, checkpoint, "rk4", checkpoint_every,
+                                                 record_every, record=lambda r: r[:, 0], on_step=on_step,
+                                                 save_state=save_state, load_state=load_state, settings=settings)
+        times, thetas = history.arrays()
+        return times, thetas, state
+    steps = int(round(t_end/step))
+    records = steps//record_every + 1
+    times = np.arange(records)*step*record_every
+    thetas = np.empty((records, state.shape[0]))
+    thetas[0] = state[:, 0]
+    t = 0.0
+    if on_step:
+        on_step(t, state)
+    for i in range(1, steps + 1):
+        state = rk4_step(f, state, t, step)
+        t += step
+        if on_step:
+            on_step(t, state)
+        if i % record_every == 0:
+            thetas[i//record_every] = state[:, 0]
+    return times, thetas, state
+
+class PhaseAnalyzer:
     """
-    Funtion that calculates the 4th order Rung-Kutta and returns it
+    Analyzes pendulums while they are being integrated, without keeping their trajectories.
+    For every pendulum it finds the upward zero crossings of theta (interpolated between steps),
+    from them the period and the peak amplitude of every swing, and how fast the amplitude
+    decays. It also counts the time spent in each (theta, omega) bin of a phase space histogram.
+    Everything kept is a fixed size per pendulum (4 KiB of histogram each with the default bins,
+    or one histogram for all of them with shared_histogram=True).
     """
-    k1 = h*f_theta_omega(angles)
-    k2 = h*f_theta_omega(angles+0.5*k1)
-    k3 = h*f_theta_omega(angles+0.5*k2)
-    k4 = h*f_theta_omega(angles+k3)
-    angles += (k1 + 2*k2 + 2*k3 + k4)/6
-    return angles
+
+    # running results, saved with checkpoints so a resumed run gives the same results
+    STATE_ARRAYS = ("histogram", "last_theta", "last_crossing", "period_sum", "period_count", "last_period",
+                    "swing_peak", "last_amplitude", "log_decrement_sum", "log_decrement_count")
+
+    def __init__(self, n, theta_range=(-np.pi, np.pi), omega_range=None, bins=(32, 32), shared_histogram=False):
+        """
+        :param n: number of pendulums
+        :param theta_range: (low, high) angles covered by the histogram
+        :param omega_range: (low, high) angular velocities covered by the histogram,
+                            by default the fastest possible swing of the module's arm length
+        :param bins: number of (theta, omega) histogram bins
+        :param shared_histogram: count all pendulums in one histogram instead of one each
+        """
+        if omega_range is None:
+            omega_range = (-2*np.sqrt(g/l), 2*np.sqrt(g/l))
+        self.n = n
+        self.theta_range = theta_range
+        self.omega_range = omega_range
+        self.bins = bins
+        self.shared_histogram = shared_histogram
+        self.histogram = np.zeros(tuple(bins) if shared_histogram else (n, bins[0], bins[1]), dtype=np.int32)
+        self.last_t = None
+        self.last_theta = np.zeros(n)
+        self.last_crossing = np.full(n, np.nan)    # time of the last upward zero crossing
+        self.period_sum = np.zeros(n)
+        self.period_count = np.zeros(n, dtype=np.int64)
+        self.last_period = np.full(n, np.nan)
+        self.swing_peak = np.zeros(n)      # largest |theta| since the last crossing
+        self.last_amplitude = np.full(n, np.nan)
+        self.log_decrement_sum = np.zeros(n)
+        self.log_decrement_count = np.zeros(n, dtype=np.int64)
+
+    def update(self, t, state):
+        """
+        Feed the state after a step
+        :param t: time of the state
+        :param state: (n, 2) array of [theta, omega] rows
+        """
+        theta = state[:, 0]
+        omega = state[:, 1]
+        np.maximum(self.swing_peak, np.abs(theta), out=self.swing_peak)
+
+        if self.last_t is not None:
+            crossed = np.flatnonzero((self.last_theta < 0) & (theta >= 0))
+            if crossed.size:
+                before = self.last_theta[crossed]
+                fraction = -before/(theta[crossed] - before)
+                crossing = self.last_t + fraction*(t - self.last_t)
+                period = crossing - self.last_crossing[crossed]
+                timed = np.isfinite(period)
+                self.period_sum[crossed[timed]] += period[timed]
+                self.period_count[crossed[timed]] += 1
+                self.last_period[crossed[timed]] = period[timed]
+                self.last_crossing[crossed] = crossing
+
+                peak = self.swing_peak[crossed]
+                previous = self.last_amplitude[crossed]
+                decayed = np.isfinite(previous) & (previous > 0) & (peak > 0)
+                self.log_decrement_sum[crossed[decayed]] += np.log(previous[decayed]/peak[decayed])
+                self.log_decrement_count[crossed[decayed]] += 1
+                self.last_amplitude[crossed] = peak
+                self.swing_peak[crossed] = 0.0
+
+        # phase space histogram, samples outside the ranges are not counted
+        theta_bin = np.floor((theta - self.theta_range[0])/(self.theta_range[1] - self.theta_range[0])*self.bins[0]).astype(np.int64)
+        omega_bin = np.floor((omega - self.omega_range[0])/(self.omega_range[1] - self.omega_range[0])*self.bins[1]).astype(np.int64)
+        inside = np.flatnonzero((theta_bin >= 0) & (theta_bin < self.bins[0]) & (omega_bin >= 0) & (omega_bin < self.bins[1]))
+        if self.shared_histogram:
+            flat = theta_bin[inside]*self.bins[1] + omega_bin[inside]
+            self.histogram += np.bincount(flat, minlength=self.histogram.size).reshape(self.histogram.shape).astype(np.int32)
+        else:
+            # each pendulum only touches its own histogram, so no index repeats
+            self.histogram[inside, theta_bin[inside], omega_bin[inside]] += 1
+
+        self.last_t = t
+        self.last_theta[:] = theta
+
+    def results(self):
+        """
+        :return: dictionary of arrays, one entry per pendulum:
+                 "period" (average), "last_period", "amplitude" (peak of the last full swing),
+                 "log_decrement" (average log of the amplitude ratio of consecutive swings),
+                 "decay_rate" (log_decrement per second) and "histogram" (n, bins) counts
+                 (just (bins) counts for a shared histogram)
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            period = self.period_sum/self.period_count
+            log_decrement = self.log_decrement_sum/self.log_decrement_count
+        return {"period": period, "last_period": self.last_period.copy(), "amplitude": self.last_amplitude.copy(),
+                "log_decrement": log_decrement, "decay_rate": log_decrement/period, "histogram": self.histogram.copy()}
+
+    def state_arrays(self):
+        """
+        :return: dictionary of the arrays needed to carry on later (see load_state_arrays)
+        """
+        arrays = {name: getattr(self, name) for name in self.STATE_ARRAYS}
+        arrays["last_t"] = np.nan if self.last_t is None else self.last_t
+        return arrays
+
+    def load_state_arrays(self, arrays):
+        """
+        Carry on from arrays saved by state_arrays, e.g. when resuming from a checkpoint
+        :param arrays: dictionary returned by state_arrays
+        """
+        for name in self.STATE_ARRAYS:
+            if arrays[name].shape != getattr(self, name).shape:
+                raise ValueError("saved analyzer {} has shape {}, not {}".format(name, arrays[name].shape, getattr(self, name).shape))
+            getattr(self, name)[...] = arrays[name]
+        last_t = float(arrays["last_t"])
+        self.last_t = None if np.isnan(last_t) else last_t
 
 def update_pos(angles, ball, arm, x_offset):
     """
@@ -63,45 +245,103 @@ def set_scene():
     stand_right.pos.x += offset # moves it to the right based on how long the arms and the radius of the ball
     box(pos=vector(0, -(l + 2*R) - W, 0), size=vector(R*70, W, R*10)) # ground   
  
-def animatePendulums():
-    # Set up initial values
-    angles_middle = np.array([np.pi*179/180, 0], float)
-    angles_right = np.array([np.pi*30/180, 0], float)
-    angles_left = np.array([np.pi*90/180, 0], float)
-    # Initial x and y
-    x = l*np.sin(angles_middle[0])
-    y = -l*np.cos(angles_middle[0])
+class RenderScheduler:
+    """
+    Keeps the physics in step with the wall clock while the scene is only redrawn once per frame.
+    Each frame asks how many physics steps are due, runs them, and then pushes just the latest
+    state to the scene. If drawing falls behind, the physics still catches up to real time and
+    the frames in between are dropped instead of being drawn late.
+    """
+
+    def __init__(self, physics_step=h, frame_rate=framerate, max_steps=None, clock=time.perf_counter):
+        """
+        :param physics_step: seconds of simulated time per physics step
+        :param frame_rate: frames per second shown
+        :param max_steps: most physics steps run for one frame (if the physics itself can't keep
+                          up, the simulation slows down instead of freezing the display)
+        :param clock: function giving the wall clock time in seconds
+        """
+        self.physics_step = physics_step
+        self.frame_rate = frame_rate
+        self.max_steps = max_steps or 10*max(1, int(np.ceil(1.0/(frame_rate*physics_step))))
+        self.clock = clock
+        self.start_time = None
+        self.steps = 0          # physics steps run so far
+        self.frames = 0         # frames drawn
+        self.dropped = 0        # frames skipped because drawing fell behind
+        self.last_frame = -1
+
+    @property
+    def sim_time(self):
+        return self.steps*self.physics_step
+
+    def steps_due(self):
+        """
+        Call once per displayed frame
+        :return: number of physics steps to run before drawing this frame
+        """
+        now = self.clock()
+        if self.start_time is None:
+            self.start_time = now
+        wall_time = now - self.start_time
+        frame = int(wall_time*self.frame_rate)
+        if self.last_frame >= 0:
+            self.dropped += max(0, frame - self.last_frame - 1)
+        self.last_frame = frame
+        self.frames += 1
+        due = int((wall_time - self.sim_time)/self.physics_step + 1e-9)
+        if due > self.max_steps:
+            # give up on the time the physics could not make up
+            self.start_time += (due - self.max_steps)*self.physics_step
+            due = self.max_steps
+        return max(due, 0)
+
+    def advance(self):
+        """
+        Call after every physics step
+        """
+        self.steps += 1
+
+def animatePendulums(history=None, scheduler=None, analyzer=None):
+    """
+    Animate the three pendulums for 15 seconds
+    :param history: History (width 3) to record the angles in, by default a new one with room
+                    for the whole run. Pass e.g. History(3, 1000, decimate=10, ring=True) to bound memory.
+    :param scheduler: RenderScheduler deciding how many physics steps to run per displayed frame
+    :param analyzer: PhaseAnalyzer (for 3 pendulums) fed the state after every physics step
+    :return: time values and the angles of the middle, right and left pendulums (numpy arrays)
+    """
+    if history is None:
+        history = History(3, capacity=int(15*framerate*steps_per_frame) + steps_per_frame)
+    # Set up initial values: middle, right and left pendulums
+    x_offsets = [0, offset, -offset]
+    state = pendulum_states(np.pi*np.array([179, 30, 90])/180)
+    f = make_pendulum_rhs(np.full(len(x_offsets), l), np.full(len(x_offsets), c))
     # setup the three pendulums
-    ball_middle = sphere(pos=vector(x, y, 0), radius=R, color=color.red)
-    ball_right = ball_middle.clone()
-    ball_right.pos.x += offset
-    ball_left = ball_middle.clone()
-    ball_left.pos.x -= offset
-    arm_middle = cylinder(pos=vector(0, 0, 0), axis=vector(x, y, 0), radius=W)
-    arm_right = arm_middle.clone()
-    arm_right.pos.x += offset
-    arm_left = arm_middle.clone()
-    arm_left.pos.x -= offset
+    balls = []
+    arms = []
+    for x_offset, angles in zip(x_offsets, state):
+        x = l*np.sin(angles[0])
+        y = -l*np.cos(angles[0])
+        balls.append(sphere(pos=vector(x + x_offset, y, 0), radius=R, color=color.red))
+        arms.append(cylinder(pos=vector(x_offset, 0, 0), axis=vector(x, y, 0), radius=W))
+    if scheduler is None:
+        scheduler = RenderScheduler(h, framerate)
     # Loop over some time interval
-    dt = 0.01
-    t = 0
-    while t < 15:
-            rate(100)
-            for i in range(steps_per_frame):
-                angles_middle = rung_kutta(angles_middle)
-                angles_right = rung_kutta(angles_right)
-                angles_left = rung_kutta(angles_left)
-
-                update_pos(angles_middle, ball_middle, arm_middle, 0)
-                update_pos(angles_right, ball_right, arm_right, offset)
-                update_pos(angles_left, ball_left, arm_left, -offset)
-
-                theta_middle.append(angles_middle[0]) # used for graphing
-                theta_right.append(angles_right[0]) # used for graphing
-                theta_left.append(angles_left[0]) # used for graphing
-                time_values.append(t)
-            t += dt
-    return time_values, theta_middle, theta_right, theta_left
+    while scheduler.sim_time < 15:
+            rate(framerate)
+            for i in range(scheduler.steps_due()):
+                state = rk4_step(f, state, scheduler.sim_time, scheduler.physics_step)
+                scheduler.advance()
+                history.append(scheduler.sim_time, state[:, 0]) # used for graphing
+                if analyzer is not None:
+                    analyzer.update(scheduler.sim_time, state)
+
+            # only the newest state is drawn
+            for angles, ball, arm, x_offset in zip(state, balls, arms, x_offsets):
+                update_pos(angles, ball, arm, x_offset)
+    time_values, thetas = history.arrays()
+    return time_values, thetas[:, 0], thetas[:, 1], thetas[:, 2]
 
 def plotPoints(time_values, theta_middle, theta_right, theta_left):
     plt.plot(time_values, theta_middle, label="Middle Pendulum")
@@ -118,7 +358,11 @@ def main():
     Function that gets everything going
     """
     set_scene()
-    time_values, theta_middle, theta_right, theta_left = animatePendulums() 
+    analyzer = PhaseAnalyzer(3)
+    time_values, theta_middle, theta_right, theta_left = animatePendulums(analyzer=analyzer)
+    results = analyzer.results()
+    for name, period, decay in zip(["Middle", "Right", "Left"], results["period"], results["decay_rate"]):
+        print("{} pendulum: period {:.4f} s, amplitude decay rate {:.4f} 1/s".format(name, period, decay))
     plotPoints(time_values, theta_middle, theta_right, theta_left)
     
 if __name__ == "__main__":
@@ -1,5 +1,8 @@
+import argparse
 import numpy as np
 from matplotlib import pyplot as plt
+from ode_solver import solve, solve_adaptive
+from checkpoint import run_with_checkpoints
 
 
 def f_x(x, t):
@@ -9,8 +12,12 @@ def f_x(x, t):
     return -x**3 + np.sin(t)
 
 
-def main():
+def main(tol=None, checkpoint=None):
     """
+    Solve dx/dt = -x**3 + sin(t) and plot it
+    :param tol: if given, use the adaptive Dormand-Prince solver with this tolerance
+                instead of N fixed 4th Order Rung-Kutta steps
+    :param checkpoint: if given, checkpoint file to save to (and resume from)
     """
     a = 0.0         # Start of interval
     b = 10.0        # End of interval
@@ -19,16 +26,15 @@ def main():
     x = 0.0         # Initial condition
 
     tpoints = np.arange(a, b, h)
-    xpoints = []
-    # loop over time interval
-    for t in tpoints:
-        xpoints.append(x)
+    if checkpoint:
+        t, x, history = run_with_checkpoints(f_x, x, b - h, h, checkpoint, method="rk4", checkpoint_every=100)
+        tpoints, xpoints = history.arrays()
+    elif tol is None:
         # Calculate the 4th Order Rung-Kutta
-        k1 = h*f_x(x,t)
-        k2 = h*f_x(x + 0.5*k1, t + 0.5*h)
-        k3 = h*f_x(x + 0.5*k2, t + 0.5*h)
-        k4 = h*f_x(x+k3, t+h)
-        x += (k1 + 2*k2 + 2*k3 + k4)/6
+        xpoints = solve(f_x, x, tpoints, method="rk4")
+    else:
+        xpoints, nfev = solve_adaptive(f_x, x, (a, b), tpoints, rtol=tol, atol=tol)
+        print("{} evaluations of f_x for tolerance {} ({} for fixed step RK4)".format(nfev, tol, 4*(N - 1)))
 
     # Plot Values
     plt.plot(tpoints, xpoints)
@@ -38,4 +44,9 @@ def main():
 
 
 # Call main
-main()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="4th Order Rung-Kutta")
+    parser.add_argument("--tol", action="store", dest="tol", type=float, default=None, help="use the adaptive solver with this tolerance --tol 1e-6")
+    parser.add_argument("--checkpoint", action="store", dest="checkpoint", default=None, help="checkpoint file to save to and resume from")
+    args = parser.parse_args()
+    main(args.tol, args.checkpoint)